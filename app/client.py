@@ -1,6 +1,7 @@
 """Module with simple wrappers for AWS clients."""
 
 import json
+import time
 
 from botocore.exceptions import ClientError
 
@@ -20,6 +21,8 @@ class BlobS3Client:
 
     """
 
+    __slots__ = ('_client', '_bucket_name', '_ttl')
+
     def __init__(self, client, bucket_name, ttl):
         """Object initializer.
 
@@ -54,25 +57,6 @@ class BlobS3Client:
             HttpMethod='PUT'
         )
 
-    def is_uploaded(self, key):
-        """Returns S3 resource upload status for specified key.
-
-         Args:
-             key (str): S3 resource key.
-
-         Returns:
-             bool: Whether blob has been uploaded or not.
-
-         """
-        try:
-            self._client.head_object(
-                Bucket=self._bucket_name,
-                Key=key
-            )
-            return True
-        except ClientError:
-            return False
-
 
 class BlobDynamoDBClient:
     """Simple wrapper for DynamoDB client.
@@ -86,6 +70,19 @@ class BlobDynamoDBClient:
 
     """
 
+    __slots__ = ('_client', '_table_name')
+
+    _UPDATE_STATUS_EXPRESSION = 'SET #status = :status'
+    _UPDATE_STATUS_ATTRIBUTE_NAMES = {'#status': 'status'}
+    _EXPECTED_STATUS_CONDITION = '#status = :expected_status'
+    _SAVE_LABELS_EXPRESSION = 'SET labels = :labels'
+    _CALLBACK_URL_PROJECTION = 'callback_url'
+    _CONDITIONAL_CHECK_FAILED = 'ConditionalCheckFailedException'
+    _BATCH_WRITE_LIMIT = 25
+    _BATCH_WRITE_BACKOFF = 0.05
+    _BATCH_WRITE_BACKOFF_CAP = 1.0
+    _BATCH_WRITE_MAX_ATTEMPTS = 5
+
     def __init__(self, client, table_name):
         """Object initializer.
 
@@ -108,13 +105,50 @@ class BlobDynamoDBClient:
         """
         self._client.put_item(
             TableName=self._table_name,
-            Item={
-                'blob_id': {'S': blob_id},
-                'callback_url': {'S': callback_url},
-                'status': {'S': status}
-            }
+            Item=self._item(blob_id, callback_url, status)
         )
 
+    def create_many(self, items):
+        """Creates new table items using as few requests as possible.
+
+        Items are written in chunks of 25 (BatchWriteItem limit),
+        unprocessed items are retried with capped exponential backoff,
+        up to 5 requests per chunk.
+
+        Note: Not used by any Lambda, so function role isn't granted
+        dynamodb:BatchWriteItem permission.
+
+        Args:
+            items (list): List of (blob_id, callback_url, status) tuples.
+
+        Returns:
+            list: IDs of the items that are still unprocessed after all attempts.
+
+        """
+        unprocessed = []
+        for start in range(0, len(items), self._BATCH_WRITE_LIMIT):
+            request_items = {
+                self._table_name: [
+                    {'PutRequest': {'Item': self._item(blob_id, callback_url, status)}}
+                    for blob_id, callback_url, status in items[start:start + self._BATCH_WRITE_LIMIT]
+                ]
+            }
+            delay = self._BATCH_WRITE_BACKOFF
+            for attempt in range(1, self._BATCH_WRITE_MAX_ATTEMPTS + 1):
+                response = self._client.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems')
+                if not request_items:
+                    break
+                if attempt < self._BATCH_WRITE_MAX_ATTEMPTS:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self._BATCH_WRITE_BACKOFF_CAP)
+            else:
+                unprocessed.extend(
+                    request['PutRequest']['Item']['blob_id']['S']
+                    for request in request_items[self._table_name]
+                )
+        return unprocessed
+
     def update_status(self, blob_id, status):
         """Update item status.
 
@@ -125,44 +159,80 @@ class BlobDynamoDBClient:
         """
         self._client.update_item(
             TableName=self._table_name,
-            Key={'blob_id': {'S': blob_id}},
-            UpdateExpression='SET #status = :status',
-            ExpressionAttributeValues={
-                ':status': {'S': status}
-            },
-            ExpressionAttributeNames={
-                '#status': 'status'
-            }
+            Key=self._key(blob_id),
+            UpdateExpression=self._UPDATE_STATUS_EXPRESSION,
+            ExpressionAttributeValues={':status': {'S': status}},
+            ExpressionAttributeNames=self._UPDATE_STATUS_ATTRIBUTE_NAMES
         )
 
-    def save_labels(self, blob_id, labels):
-        """Save labels to the item.
+    def update_status_if(self, blob_id, status, expected_status):
+        """Update item status only if the item currently has expected status.
+
+        Check and update are done by DynamoDB within single conditional request.
+        Failed condition is recognized by the error code, since DAX client raises
+        botocore ClientError as well but has no modeled exception classes.
+
+        Args:
+            blob_id (str): Item ID (simple primary key).
+            status (str): New recognition status.
+            expected_status (str): Recognition status item must have to be updated.
+
+        Returns:
+            bool: Whether status has been updated or not.
+
+        """
+        try:
+            self._client.update_item(
+                TableName=self._table_name,
+                Key=self._key(blob_id),
+                UpdateExpression=self._UPDATE_STATUS_EXPRESSION,
+                ConditionExpression=self._EXPECTED_STATUS_CONDITION,
+                ExpressionAttributeValues={
+                    ':status': {'S': status},
+                    ':expected_status': {'S': expected_status}
+                },
+                ExpressionAttributeNames=self._UPDATE_STATUS_ATTRIBUTE_NAMES
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != self._CONDITIONAL_CHECK_FAILED:
+                raise
+            return False
+
+    def save_labels(self, blob_id, labels, expected_status):
+        """Save labels to the item only if the item currently has expected status.
+
+        Item that has already reached another status (e.g. retried step
+        has already completed recognition) is left as is, without consuming a write.
 
         Args:
             blob_id (str): Item ID (simple primary key).
             labels (list): List of labels to be saved.
+            expected_status (str): Recognition status item must have to be updated.
+
+        Returns:
+            bool: Whether labels have been saved or not.
 
         """
-        data = {
-            'L': [
-                {
-                    'M': {
-                        'label': {'S': item['label']},
-                        'confidence': {'N': str(item['confidence'])},
-                        'parents': {'L': [{'S': i} for i in item['parents']]}
-                    }
-                }
-                for item in labels
-            ]
-        }
-        self._client.update_item(
-            TableName=self._table_name,
-            Key={'blob_id': {'S': blob_id}},
-            UpdateExpression='SET labels = :labels',
-            ExpressionAttributeValues={
-                ':labels': data
-            }
-        )
+        parent_attributes = {}
+        data = {'L': [self._marshal_label(label, parent_attributes) for label in labels]}
+        try:
+            self._client.update_item(
+                TableName=self._table_name,
+                Key=self._key(blob_id),
+                UpdateExpression=self._SAVE_LABELS_EXPRESSION,
+                ConditionExpression=self._EXPECTED_STATUS_CONDITION,
+                ExpressionAttributeValues={
+                    ':labels': data,
+                    ':expected_status': {'S': expected_status}
+                },
+                ExpressionAttributeNames=self._UPDATE_STATUS_ATTRIBUTE_NAMES
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != self._CONDITIONAL_CHECK_FAILED:
+                raise
+            return False
 
     def get_blob(self, blob_id):
         """Returns blob by its ID.
@@ -176,28 +246,119 @@ class BlobDynamoDBClient:
         """
         response = self._client.get_item(
             TableName=self._table_name,
-            Key={
-                'blob_id': {'S': blob_id}
-            }
+            Key=self._key(blob_id)
         )
         item = response.get('Item')
         if item is None:
             return None
+        labels = item.get('labels')
         blob = {
-            'blob_id': item.get('blob_id').get('S'),
-            'callback_url': item.get('callback_url').get('S'),
-            'status': item.get('status').get('S'),
-            'labels': [
-                {
-                    'label': label_item.get('M').get('label').get('S'),
-                    'confidence': float(label_item.get('M').get('confidence').get('N')),
-                    'parents': [parent.get('S') for parent in label_item.get('M').get('parents').get('L')]
-                }
-                for label_item in item.get('labels', {}).get('L', [])
-            ]
+            'blob_id': item['blob_id']['S'],
+            'callback_url': item['callback_url']['S'],
+            'status': item['status']['S'],
+            'labels': [] if labels is None else [self._unmarshal_label(i['M']) for i in labels['L']]
         }
         return blob
 
+    def get_callback_url(self, blob_id):
+        """Returns callback url of the blob.
+
+        Only callback_url attribute is fetched, so stored labels
+        are neither transferred nor unmarshalled.
+
+        Args:
+            blob_id (str): Item ID (simple primary key).
+
+        Returns:
+            Callback url if blob is found, None otherwise
+
+        """
+        response = self._client.get_item(
+            TableName=self._table_name,
+            Key=self._key(blob_id),
+            ProjectionExpression=self._CALLBACK_URL_PROJECTION
+        )
+        item = response.get('Item')
+        if item is None:
+            return None
+        return item['callback_url']['S']
+
+    @staticmethod
+    def _key(blob_id):
+        """Returns primary key of the item.
+
+        Args:
+            blob_id (str): Item ID (simple primary key).
+
+        Returns:
+            dict: Key in DynamoDB attribute format.
+
+        """
+        return {'blob_id': {'S': blob_id}}
+
+    @staticmethod
+    def _item(blob_id, callback_url, status):
+        """Returns new item in DynamoDB attribute format.
+
+        Args:
+            blob_id (str): Item ID (simple primary key).
+            callback_url (str): Callback that will be invoked after recognition.
+            status (str): Recognition status.
+
+        Returns:
+            dict: Item attributes.
+
+        """
+        return {
+            'blob_id': {'S': blob_id},
+            'callback_url': {'S': callback_url},
+            'status': {'S': status}
+        }
+
+    @staticmethod
+    def _marshal_label(label, parent_attributes):
+        """Converts label to the DynamoDB map attribute.
+
+        Args:
+            label (dict): Label with 'label', 'confidence' and 'parents' keys.
+            parent_attributes (dict): Parent attributes already built for the request,
+                labels often share parents, so same attribute is reused.
+
+        Returns:
+            dict: Label in DynamoDB attribute format.
+
+        """
+        parents = []
+        for parent in label['parents']:
+            attribute = parent_attributes.get(parent)
+            if attribute is None:
+                attribute = parent_attributes[parent] = {'S': parent}
+            parents.append(attribute)
+        return {
+            'M': {
+                'label': {'S': label['label']},
+                'confidence': {'N': str(label['confidence'])},
+                'parents': {'L': parents}
+            }
+        }
+
+    @staticmethod
+    def _unmarshal_label(attributes):
+        """Converts label from DynamoDB map attribute to the plain dict.
+
+        Args:
+            attributes (dict): Attributes of the label map ('M' value).
+
+        Returns:
+            dict: Label with 'label', 'confidence' and 'parents' keys.
+
+        """
+        return {
+            'label': attributes['label']['S'],
+            'confidence': float(attributes['confidence']['N']),
+            'parents': [parent['S'] for parent in attributes['parents']['L']]
+        }
+
 
 class BlobStepFunctionClient:
     """Simple wrapper for StepFunction client.
@@ -211,6 +372,10 @@ class BlobStepFunctionClient:
 
     """
 
+    __slots__ = ('_client', '_state_machine_arn')
+
+    _INPUT_TEMPLATE = '{{"blob_id": {}}}'
+
     def __init__(self, client, state_machine_arn):
         """Object initializer.
 
@@ -226,7 +391,8 @@ class BlobStepFunctionClient:
         """Starts state machine execution.
 
         Execution name will be the same as passed in blob_id.
-        Passes in input the object with blob_id key (as json string).
+        Passes in input the object with blob_id key (as json string),
+        only blob_id itself goes through json encoder.
 
         Args:
             blob_id: Item ID to recognize.
@@ -235,7 +401,7 @@ class BlobStepFunctionClient:
         return self._client.start_execution(
             stateMachineArn=self._state_machine_arn,
             name=blob_id,
-            input=json.dumps({'blob_id': blob_id})
+            input=self._INPUT_TEMPLATE.format(json.dumps(blob_id))
         )
 
 
@@ -253,6 +419,8 @@ class BlobRekognitionClient:
 
     """
 
+    __slots__ = ('_client', '_bucket_name', '_max_labels', '_min_confidence')
+
     def __init__(self, client, bucket_name, max_labels, min_confidence):
         """Object initializer.
 
@@ -295,11 +463,11 @@ class BlobRekognitionClient:
             )
         except self._client.exceptions.InvalidImageFormatException as e:
             raise InvalidBlobHasBeenUploaded(
-                message='Invalid image format has been uploaded.',
+                message=InvalidBlobHasBeenUploaded.blob_message,
                 payload={'blob_id': blob_id}
             )
         except self._client.exceptions.ImageTooLargeException as e:
             raise TooLargeBlobHasBeenUploaded(
-                message='Too large image has been uploaded.',
+                message=TooLargeBlobHasBeenUploaded.blob_message,
                 payload={'blob_id': blob_id}
             )
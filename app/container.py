@@ -1,9 +1,10 @@
 """Module with DI configuration."""
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 
-import boto3
-import requests
+from botocore.config import Config
 
 from .client import (
     BlobS3Client,
@@ -16,7 +17,6 @@ from .lambdas import (
     ImageHasBeenUploadedHandler,
     GetLabelsHandler,
     TransformLabelsHandler,
-    SaveLabelsHandler,
     InvokeCallbackHandler,
     GetRecognitionResultHandler,
     uuid_generator,
@@ -30,7 +30,6 @@ from .usecase import (
     StartRecognition,
     GetLabels,
     TransformLabels,
-    SaveLabels,
     InvokeCallback,
     Invoker,
     GetRecognitionResult,
@@ -40,16 +39,79 @@ from .usecase import (
 
 BLOBS_BUCKET_NAME = os.environ.get('blobsBucketName')
 BLOBS_TABLE_NAME = os.environ.get('blobsTableName')
-PRESIGNED_URL_TTL = os.environ.get('presignedUrlTTL', 30)
+PRESIGNED_URL_TTL = int(os.environ.get('presignedUrlTTL', 30))
 UPLOADING_WAITING_TIME = os.environ.get('uploadingWaitingTime')
 UPLOADING_STEP_FUNCTION_ARN = os.environ.get('uploadingStepFunctionArn')
 RECOGNITION_STEP_FUNCTION_ARN = os.environ.get('recognitionStepFunctionArn')
-MAX_LABELS = os.environ.get('maxLabels', 10)
-MIN_CONFIDENCE = os.environ.get('minConfidence', 50)
-CALLBACK_TIMEOUT = os.environ.get('callbackTimeout', 10)
+MAX_LABELS = int(os.environ.get('maxLabels', 10))
+MIN_CONFIDENCE = int(os.environ.get('minConfidence', 50))
+CALLBACK_CONNECT_TIMEOUT = int(os.environ.get('callbackConnectTimeout', 3))
+CALLBACK_TIMEOUT = int(os.environ.get('callbackTimeout', 10))
+CALLBACK_MAX_ATTEMPTS = int(os.environ.get('callbackMaxAttempts', 3))
+DAX_ENDPOINT = os.environ.get('daxEndpoint')
+PARAMETER_VALIDATION = os.environ.get('parameterValidation', 'true')
+
+CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    retries={'mode': 'standard'},
+    parameter_validation=PARAMETER_VALIDATION.lower() != 'false'
+)
+
+
+@lru_cache(maxsize=None)
+def get_session():
+    """Returns boto3 session shared by all clients within the process.
+
+    boto3 is imported here, so it is loaded only by Lambdas that talk to AWS.
+
+    """
+    import boto3.session
+    return boto3.session.Session()
+
+
+@lru_cache(maxsize=None)
+def get_client(service_name):
+    """Returns boto3 client for specified service.
+
+    Client is created once per process (i.e. once per Lambda cold start),
+    so endpoint resolution, credentials lookup and service model loading
+    don't happen again on warm invocations.
+
+    Args:
+        service_name (str): Name of the AWS service.
+
+    Returns:
+        obj: Low-level boto3 client.
+
+    """
+    return get_session().client(service_name, config=CLIENT_CONFIG)
+
+
+@lru_cache(maxsize=None)
+def get_dax_client(endpoint):
+    """Returns DAX client for specified cluster endpoint.
+
+    amazondax is imported here, so the package is required
+    only when DAX endpoint is configured.
+
+    Args:
+        endpoint (str): DAX cluster endpoint.
+
+    Returns:
+        obj: Client that implements boto3.client('dynamodb') interface.
+
+    """
+    from amazondax import AmazonDaxClient
+    return AmazonDaxClient(get_session(), endpoints=[endpoint])
 
 
 class Container:
+    """DI container.
+
+    Every component is built on first access and cached afterwards,
+    so a Lambda builds only the clients, use cases and handlers it actually uses.
+
+    """
 
     def __init__(self, *, testing_mode=False):
         """Container initializer.
@@ -58,134 +120,214 @@ class Container:
             testing_mode (bool): Whether container should be set up in testing mode or not.
 
         """
-        if testing_mode:
-            s3_client = object()
-            dynamodb_client = object()
-            rekognition_client = object()
-            step_function_client = object()
-        else:
-            s3_client = boto3.client('s3')
-            dynamodb_client = boto3.client('dynamodb')
-            rekognition_client = boto3.client('rekognition')
-            step_function_client = boto3.client('stepfunctions')
-
-        # clients
-
-        self.blob_s3_client = BlobS3Client(
-            client=s3_client,
+        self._testing_mode = testing_mode
+
+    def warm_up(self, handler_path):
+        """Builds handler for specified Lambda entry point with all its dependencies.
+
+        Meant to be called at import time, so clients are created and credentials
+        are resolved during Lambda INIT phase instead of the first invocation.
+
+        Args:
+            handler_path (str): Lambda handler path, e.g. 'app.handler.get_labels_handler'.
+
+        """
+        name = handler_path.rpartition('.')[2]
+        if not name.endswith('_handler') or not hasattr(type(self), name):
+            return
+        getattr(self, name)
+        if not self._testing_mode:
+            get_session().get_credentials()
+
+    def _get_client(self, service_name):
+        """Returns actual AWS client (or a placeholder in testing mode).
+
+        Args:
+            service_name (str): Name of the AWS service.
+
+        """
+        if self._testing_mode:
+            return object()
+        return get_client(service_name)
+
+    def _get_dynamodb_client(self):
+        """Returns DynamoDB client (DAX client if DAX endpoint is configured).
+
+        Writes go through DAX as well, so its item cache is updated
+        on write instead of serving stale blob status until it expires.
+
+        """
+        if self._testing_mode or not DAX_ENDPOINT:
+            return self._get_client('dynamodb')
+        return get_dax_client(DAX_ENDPOINT)
+
+    # clients
+
+    @cached_property
+    def blob_s3_client(self):
+        return BlobS3Client(
+            client=self._get_client('s3'),
             bucket_name=BLOBS_BUCKET_NAME,
-            ttl=int(PRESIGNED_URL_TTL)
+            ttl=PRESIGNED_URL_TTL
         )
 
-        self.blob_dynamodb_client = BlobDynamoDBClient(
-            client=dynamodb_client,
+    @cached_property
+    def blob_dynamodb_client(self):
+        return BlobDynamoDBClient(
+            client=self._get_dynamodb_client(),
             table_name=BLOBS_TABLE_NAME
         )
 
-        self.uploading_step_function_client = BlobStepFunctionClient(
-            client=step_function_client,
+    @cached_property
+    def uploading_step_function_client(self):
+        return BlobStepFunctionClient(
+            client=self._get_client('stepfunctions'),
             state_machine_arn=UPLOADING_STEP_FUNCTION_ARN
         )
 
-        self.recognition_step_function_client = BlobStepFunctionClient(
-            client=step_function_client,
+    @cached_property
+    def recognition_step_function_client(self):
+        return BlobStepFunctionClient(
+            client=self._get_client('stepfunctions'),
             state_machine_arn=RECOGNITION_STEP_FUNCTION_ARN
         )
 
-        self.blob_rekognition_client = BlobRekognitionClient(
-            client=rekognition_client,
+    @cached_property
+    def blob_rekognition_client(self):
+        return BlobRekognitionClient(
+            client=self._get_client('rekognition'),
             bucket_name=BLOBS_BUCKET_NAME,
-            max_labels=int(MAX_LABELS),
-            min_confidence=int(MIN_CONFIDENCE)
+            max_labels=MAX_LABELS,
+            min_confidence=MIN_CONFIDENCE
         )
 
-        # services
-
-        self.url_validator = UrlValidator()
-
-        self.invoker = Invoker(
-            http_invoke=requests.post,
-            timeout=int(CALLBACK_TIMEOUT)
+    # services
+
+    @cached_property
+    def url_validator(self):
+        return UrlValidator()
+
+    @cached_property
+    def executor(self):
+        return ThreadPoolExecutor(max_workers=1)
+
+    @cached_property
+    def invoker(self):
+        from http.cookiejar import DefaultCookiePolicy
+
+        import requests
+        # session is shared by callbacks of all blobs, so cookies set by one
+        # callback server must not be sent with the later callbacks
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return Invoker(
+            http_invoke=session.post,
+            timeout=(CALLBACK_CONNECT_TIMEOUT, CALLBACK_TIMEOUT),
+            max_attempts=CALLBACK_MAX_ATTEMPTS
         )
 
-        # use cases
+    # use cases
 
-        self.initialize_upload_listening = InitializeUploadListening(
+    @cached_property
+    def initialize_upload_listening(self):
+        return InitializeUploadListening(
             blob_s3_client=self.blob_s3_client,
             blob_dynamodb_client=self.blob_dynamodb_client,
             uploading_step_function_client=self.uploading_step_function_client,
-            validator=self.url_validator
+            validator=self.url_validator,
+            executor=self.executor
         )
 
-        self.check_uploading = CheckUploading(
-            blob_s3_client=self.blob_s3_client,
+    @cached_property
+    def check_uploading(self):
+        return CheckUploading(
             blob_dynamodb_client=self.blob_dynamodb_client
         )
 
-        self.start_recognition = StartRecognition(
+    @cached_property
+    def start_recognition(self):
+        return StartRecognition(
             recognition_step_function_client=self.recognition_step_function_client,
             blob_dynamodb_client=self.blob_dynamodb_client
         )
 
-        self.get_labels = GetLabels(
+    @cached_property
+    def get_labels(self):
+        return GetLabels(
             blob_rekognition_client=self.blob_rekognition_client,
             blob_dynamodb_client=self.blob_dynamodb_client
         )
 
-        self.transform_labels = TransformLabels()
+    @cached_property
+    def transform_labels(self):
+        return TransformLabels()
 
-        self.save_labels = SaveLabels(
-            blob_dynamodb_client=self.blob_dynamodb_client
-        )
-
-        self.invoke_callback = InvokeCallback(
+    @cached_property
+    def invoke_callback(self):
+        return InvokeCallback(
             blob_dynamodb_client=self.blob_dynamodb_client,
             invoker=self.invoker
         )
 
-        self.handle_unexpected_error = HandleUnexpectedError(
+    @cached_property
+    def handle_unexpected_error(self):
+        return HandleUnexpectedError(
             blob_dynamodb_client=self.blob_dynamodb_client
         )
 
-        self.get_recognition_result = GetRecognitionResult(
+    @cached_property
+    def get_recognition_result(self):
+        return GetRecognitionResult(
             blob_dynamodb_client=self.blob_dynamodb_client
         )
 
-        # lambdas
+    # lambdas
 
-        self.initialize_upload_listening_handler = InitializeUploadListeningHandler(
+    @cached_property
+    def initialize_upload_listening_handler(self):
+        return InitializeUploadListeningHandler(
             id_generator=uuid_generator,
             initialize_upload_listening=self.initialize_upload_listening
         )
 
-        self.check_uploading_handler = CheckUploadingHandler(
+    @cached_property
+    def check_uploading_handler(self):
+        return CheckUploadingHandler(
             check_uploading=self.check_uploading
         )
 
-        self.image_has_been_uploaded_handler = ImageHasBeenUploadedHandler(
+    @cached_property
+    def image_has_been_uploaded_handler(self):
+        return ImageHasBeenUploadedHandler(
             start_recognition=self.start_recognition
         )
 
-        self.get_labels_handler = GetLabelsHandler(
+    @cached_property
+    def get_labels_handler(self):
+        return GetLabelsHandler(
             get_labels=self.get_labels
         )
 
-        self.transform_labels_handler = TransformLabelsHandler(
+    @cached_property
+    def transform_labels_handler(self):
+        return TransformLabelsHandler(
             transform_labels=self.transform_labels
         )
 
-        self.save_labels_handler = SaveLabelsHandler(
-            save_labels=self.save_labels
-        )
-
-        self.invoke_callback_handler = InvokeCallbackHandler(
+    @cached_property
+    def invoke_callback_handler(self):
+        return InvokeCallbackHandler(
             invoke_callback=self.invoke_callback
         )
 
-        self.unexpected_error_fallback_handler = UnexpectedErrorFallbackHandler(
+    @cached_property
+    def unexpected_error_fallback_handler(self):
+        return UnexpectedErrorFallbackHandler(
             handle_unexpected_error=self.handle_unexpected_error
         )
 
-        self.get_recognition_result_handler = GetRecognitionResultHandler(
+    @cached_property
+    def get_recognition_result_handler(self):
+        return GetRecognitionResultHandler(
             get_recognition_result=self.get_recognition_result
         )
@@ -1,29 +1,49 @@
 """Module with data transfer objects."""
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 
 
-@dataclass
+@dataclass(frozen=True)
 class Dto:
+    """Base class for immutable data transfer objects.
+
+    Fields are stored in __slots__ (declared explicitly,
+    as dataclass(slots=True) requires python 3.10).
+
+    """
+
+    __slots__ = ()
 
     def as_dict(self):
-        return asdict(self)
+        """Returns shallow dict of the fields.
+
+        Unlike dataclasses.asdict, field values are not deep-copied:
+        DTO are serialized right after conversion, so copying is pure overhead.
 
+        """
+        return {field.name: getattr(self, field.name) for field in fields(self)}
 
-@dataclass
+
+@dataclass(frozen=True)
 class UploadInitializingResult(Dto):
+    __slots__ = ('blob_id', 'upload_url', 'callback_url')
+
     blob_id: str
     upload_url: str
     callback_url: str
 
 
-@dataclass
+@dataclass(frozen=True)
 class RecognitionStepFunctionResult(Dto):
+    __slots__ = ('blob_id', 'labels')
+
     blob_id: str
     labels: list
 
 
-@dataclass
+@dataclass(frozen=True)
 class BlobRecognitionResult(Dto):
+    __slots__ = ('blob_id', 'labels')
+
     blob_id: str
     labels: list
@@ -6,6 +6,8 @@ class RecognitionBaseException(Exception):
 
     Attributes:
         payload (dict): Additional data of error context.
+        blob_message (str): Message used when exception is built for blob by for_blob
+            (defined only by exceptions of blob recognition statuses).
 
     """
 
@@ -15,6 +17,20 @@ class RecognitionBaseException(Exception):
         super().__init__(message)
         self.payload = payload
 
+    @classmethod
+    def for_blob(cls, blob_id, status):
+        """Returns exception for blob with specified recognition status.
+
+        Args:
+            blob_id (str): Blob ID.
+            status (str): Recognition status of the blob.
+
+        Returns:
+            RecognitionBaseException: Exception with blob_id and status in payload.
+
+        """
+        return cls(message=cls.blob_message, payload={'blob_id': blob_id, 'status': status})
+
 
 class CallbackUrlIsNotValid(RecognitionBaseException):
     """Called when invalid callback url is passed in."""
@@ -23,26 +39,38 @@ class CallbackUrlIsNotValid(RecognitionBaseException):
 class BlobWasNotFound(RecognitionBaseException):
     """Called when requested blob is not found."""""
 
+    blob_message = 'Blob not found.'
+
 
 class BlobIsNotUploadedYet(RecognitionBaseException):
     """Called when requested blob has not been uploaded yet."""
 
+    blob_message = 'Blob hasn\'t been uploaded yet.'
+
 
 class BlobUploadTimedOut(RecognitionBaseException):
     """Called when requested blob upload is timed out."""
 
+    blob_message = 'Blob upload is timed out.'
+
 
 class BlobRecognitionIsInProgress(RecognitionBaseException):
     """Called when blob recognition process hasn't completed yet."""
 
+    blob_message = 'Recognition is in progress.'
+
 
 class InvalidBlobHasBeenUploaded(RecognitionBaseException):
     """Called when invalid blob has been uploaded."""
 
+    blob_message = 'Invalid image format has been uploaded.'
+
 
 class TooLargeBlobHasBeenUploaded(RecognitionBaseException):
     """Called when too large blob has been uploaded."""
 
+    blob_message = 'Too large image has been uploaded.'
+
 
 class RecognitionStepHasBeenFailed(RecognitionBaseException):
     """Called when recognition step has been failed."""
@@ -50,3 +78,5 @@ class RecognitionStepHasBeenFailed(RecognitionBaseException):
 
 class UnexpectedErrorOccurred(RecognitionBaseException):
     """Called when unexpected error occurred while recognition."""
+
+    blob_message = 'Unexpected error occurred while recognition, try again.'
@@ -1,17 +1,46 @@
-"""Module with lambda handlers definition."""
+"""Module with lambda handlers definition.
+
+Each Lambda builds only the components its own handler needs,
+during INIT phase (Lambda exposes handler path in _HANDLER variable).
+
+"""
+
+import os
 
 from .container import Container
 
 
 container = Container()
+container.warm_up(os.environ.get('_HANDLER', ''))
+
+
+def initialize_upload_listening_handler(event, context):
+    return container.initialize_upload_listening_handler.handle(event, context)
+
+
+def check_uploading_handler(event, context):
+    return container.check_uploading_handler.handle(event, context)
+
+
+def image_has_been_uploaded_handler(event, context):
+    return container.image_has_been_uploaded_handler.handle(event, context)
+
+
+def get_labels_handler(event, context):
+    return container.get_labels_handler.handle(event, context)
+
+
+def transform_labels_handler(event, context):
+    return container.transform_labels_handler.handle(event, context)
+
+
+def invoke_callback_handler(event, context):
+    return container.invoke_callback_handler.handle(event, context)
+
+
+def get_recognition_result_handler(event, context):
+    return container.get_recognition_result_handler.handle(event, context)
 
 
-initialize_upload_listening_handler = container.initialize_upload_listening_handler.handle
-check_uploading_handler = container.check_uploading_handler.handle
-image_has_been_uploaded_handler = container.image_has_been_uploaded_handler.handle
-get_labels_handler = container.get_labels_handler.handle
-transform_labels_handler = container.transform_labels_handler.handle
-save_labels_handler = container.save_labels_handler.handle
-invoke_callback_handler = container.invoke_callback_handler.handle
-get_recognition_result_handler = container.get_recognition_result_handler.handle
-unexpected_error_fallback_handler = container.unexpected_error_fallback_handler.handle
+def unexpected_error_fallback_handler(event, context):
+    return container.unexpected_error_fallback_handler.handle(event, context)
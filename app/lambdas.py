@@ -1,10 +1,11 @@
 """Module with actual lambda handlers."""
 
-from collections import namedtuple
+from collections import deque, namedtuple
 from functools import wraps
 from http import HTTPStatus
 from json import dumps, loads
-from uuid import uuid4
+from os import urandom
+from uuid import UUID
 
 from .exception import (
     CallbackUrlIsNotValid,
@@ -25,17 +26,21 @@ Used for passing result from lambda to response formatter.
 """
 
 
+HTTP_API_RESPONSE_HEADERS = {'Content-Type': 'application/json'}
+"""dict: Headers of every HTTP API response (shared, must not be mutated)."""
+
+
 def with_http_api_response_format(function):
     """Decorator that wraps lambda handler to format its result to match HTTP API spec."""
     @wraps(function)
     def inner(*args, **kwargs):
         """Formats lambda result to match HTTP API spec."""
-        response = function(*args, **kwargs)
+        body, status_code = function(*args, **kwargs)
         return {
             'isBase64Encoded': False,
-            'statusCode': response.status_code,
-            'headers': {'Content-Type': 'application/json'},
-            'body': dumps(response.body)
+            'statusCode': status_code,
+            'headers': HTTP_API_RESPONSE_HEADERS,
+            'body': dumps(body)
         }
     return inner
 
@@ -87,7 +92,7 @@ class ImageHasBeenUploadedHandler:
         self._start_recognition = start_recognition
 
     def handle(self, event, context):
-        blob_id = event.get('Records')[0].get('s3').get('object').get('key')
+        blob_id = event['Records'][0]['s3']['object']['key']
         self._start_recognition(blob_id)
 
 
@@ -122,22 +127,6 @@ class TransformLabelsHandler:
         return self._transform_labels(blob_id, labels).as_dict()
 
 
-class SaveLabelsHandler:
-    """Lambda handler that saves labels to the DynamoDB and passes result forward.
-
-    Note: This is part of StepFunction.
-
-    """
-
-    def __init__(self, save_labels):
-        self._save_labels = save_labels
-
-    def handle(self, event, context):
-        blob_id = event.get('blob_id')
-        labels = event.get('labels')
-        return self._save_labels(blob_id, labels).as_dict()
-
-
 class InvokeCallbackHandler:
     """Lambda handler that invokes callback with recognition result.
 
@@ -179,7 +168,7 @@ class GetRecognitionResultHandler:
 
     @with_http_api_response_format
     def handle(self, event, context):
-        blob_id = event.get('pathParameters').get('blob_id')
+        blob_id = event['pathParameters']['blob_id']
         try:
             result = self._get_recognition_result(blob_id)
         except (
@@ -204,10 +193,28 @@ class GetRecognitionResultHandler:
         )
 
 
+UUID_POOL_SIZE = 64
+"""int: Number of UUIDs generated from a single urandom call."""
+
+_uuid_pool = deque()
+
+
 def uuid_generator():
-    return str(uuid4())
+    """Returns random (version 4) UUID string.
+
+    UUIDs are taken from the pool that is refilled from a single
+    urandom call, instead of reading entropy for each one.
+
+    """
+    if not _uuid_pool:
+        entropy = urandom(16 * UUID_POOL_SIZE)
+        _uuid_pool.extend(
+            str(UUID(bytes=entropy[i:i + 16], version=4))
+            for i in range(0, len(entropy), 16)
+        )
+    return _uuid_pool.popleft()
 
 
 def get_callback_url_from_event(event):
-    body = loads(event.get('body'))
+    body = loads(event['body'])
     return body.get('callback_url', '').strip()
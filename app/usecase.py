@@ -1,8 +1,9 @@
 """Module with possible use-cases of recognition process."""
 
-import requests.exceptions
-from marshmallow.exceptions import ValidationError
-from marshmallow.validate import URL
+import random
+import re
+import time
+from concurrent.futures import wait
 
 from .domain import RecognitionStatus
 from .dto import (
@@ -23,6 +24,19 @@ from .exception import (
 )
 
 
+_WAITING_FOR_UPLOAD = RecognitionStatus.WAITING_FOR_UPLOAD.value
+_UPLOAD_TIMED_OUT = RecognitionStatus.UPLOAD_TIMED_OUT.value
+_IN_PROGRESS = RecognitionStatus.IN_PROGRESS.value
+_INVALID_BLOB_HAS_BEEN_UPLOADED = RecognitionStatus.INVALID_BLOB_HAS_BEEN_UPLOADED.value
+_TOO_LARGE_BLOB_HAS_BEEN_UPLOADED = RecognitionStatus.TOO_LARGE_BLOB_HAS_BEEN_UPLOADED.value
+_SUCCESS = RecognitionStatus.SUCCESS.value
+_FAILED_DUE_TO_CALLBACK_FAILURE = RecognitionStatus.FAILED_DUE_TO_CALLBACK_FAILURE.value
+_FAILED_DUE_TO_CALLBACK_TIME_OUT = RecognitionStatus.FAILED_DUE_TO_CALLBACK_TIME_OUT.value
+_FAILED_DUE_TO_CALLBACK_CONNECTION = RecognitionStatus.FAILED_DUE_TO_CALLBACK_CONNECTION.value
+_NOT_FOUND = RecognitionStatus.NOT_FOUND.value
+_UNEXPECTED_ERROR = RecognitionStatus.UNEXPECTED_ERROR.value
+
+
 class InitializeUploadListening:
     """Use-case for initializing upload listening.
 
@@ -30,6 +44,10 @@ class InitializeUploadListening:
     start 'uploading step function' for observing uploading process
     and generate S3 pre-signed url.
 
+    Step function is launched in the executor while blob data is being saved,
+    as neither call depends on the other (step function checks the blob
+    only after the upload waiting time).
+
     """
 
     def __init__(
@@ -37,20 +55,26 @@ class InitializeUploadListening:
             blob_s3_client,
             blob_dynamodb_client,
             uploading_step_function_client,
-            validator
+            validator,
+            executor
             ):
         self._blob_s3_client = blob_s3_client
         self._blob_dynamodb_client = blob_dynamodb_client
         self._uploading_step_function_client = uploading_step_function_client
         self._validator = validator
+        self._executor = executor
 
     def __call__(self, blob_id, callback_url):
         self._validate_callback_url(callback_url)
-        self._blob_dynamodb_client.create(
-            blob_id, callback_url, RecognitionStatus.WAITING_FOR_UPLOAD.value
-        )
-        self._uploading_step_function_client.launch(blob_id)
-        upload_url = self._blob_s3_client.generate_presigned_url(blob_id)
+        launching = self._executor.submit(self._uploading_step_function_client.launch, blob_id)
+        try:
+            self._blob_dynamodb_client.create(
+                blob_id, callback_url, _WAITING_FOR_UPLOAD
+            )
+            upload_url = self._blob_s3_client.generate_presigned_url(blob_id)
+        finally:
+            wait((launching,))
+        launching.result()
 
         return UploadInitializingResult(
             blob_id=blob_id,
@@ -70,19 +94,34 @@ class UrlValidator:
     """Simple service for validating urls.
 
     Wrapper for marshmallow.validate.URL class.
+    Strings that can't be urls with allowed schemes are rejected by precompiled
+    regex, without going through marshmallow exception flow.
+
+    marshmallow is imported on validator creation, so Lambdas
+    that never validate urls don't load it.
 
     """
 
     def __init__(self, schemes=None):
+        from marshmallow.exceptions import ValidationError
+        from marshmallow.validate import URL
+
         if schemes is None:
             schemes = ['http', 'https']
         self._validate = URL(schemes=schemes)
+        self._validation_error = ValidationError
+        self._candidate_regex = re.compile(
+            r'(?:{})://\S+\Z'.format('|'.join(re.escape(scheme) for scheme in schemes)),
+            re.IGNORECASE
+        )
 
     def is_valid_url(self, url):
+        if not url or self._candidate_regex.match(url) is None:
+            return False
         try:
             self._validate(url)
             return True
-        except ValidationError:
+        except self._validation_error:
             return False
 
 
@@ -91,17 +130,16 @@ class CheckUploading:
 
     If pre-signed url was never used to upload file / failed while uploading,
     we'll set 'not uploaded' status for this blob.
+    Uploaded blob has already been moved to the 'in progress' status
+    by recognition start, so only blobs still waiting for upload are updated.
 
     """
 
-    def __init__(self, blob_s3_client, blob_dynamodb_client):
-        self._blob_s3_client = blob_s3_client
+    def __init__(self, blob_dynamodb_client):
         self._blob_dynamodb_client = blob_dynamodb_client
 
     def __call__(self, blob_id):
-        if self._blob_s3_client.is_uploaded(blob_id):
-            return
-        self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.UPLOAD_TIMED_OUT.value)
+        self._blob_dynamodb_client.update_status_if(blob_id, _UPLOAD_TIMED_OUT, _WAITING_FOR_UPLOAD)
 
 
 class StartRecognition:
@@ -120,7 +158,7 @@ class StartRecognition:
         self._blob_dynamodb_client = blob_dynamodb_client
 
     def __call__(self, blob_id):
-        self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.IN_PROGRESS.value)
+        self._blob_dynamodb_client.update_status(blob_id, _IN_PROGRESS)
         self._recognition_step_function_client.launch(blob_id)
 
 
@@ -139,10 +177,10 @@ class GetLabels:
         try:
             raw_labels_data = self._blob_rekognition_client.detect_labels(blob_id)
         except InvalidBlobHasBeenUploaded as e:
-            self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.INVALID_BLOB_HAS_BEEN_UPLOADED.value)
+            self._blob_dynamodb_client.update_status(blob_id, _INVALID_BLOB_HAS_BEEN_UPLOADED)
             raise RecognitionStepHasBeenFailed(message=str(e), payload={'blob_id': blob_id})
         except TooLargeBlobHasBeenUploaded as e:
-            self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.TOO_LARGE_BLOB_HAS_BEEN_UPLOADED.value)
+            self._blob_dynamodb_client.update_status(blob_id, _TOO_LARGE_BLOB_HAS_BEEN_UPLOADED)
             raise RecognitionStepHasBeenFailed(message=str(e), payload={'blob_id': blob_id})
         return RecognitionStepFunctionResult(
             blob_id=blob_id,
@@ -160,34 +198,26 @@ class TransformLabels:
         )
 
     def _transform(self, raw_labels_data):
-        labels = raw_labels_data.get('Labels')
-        return [
-            {
-                'label': label.get('Name', ''),
-                'confidence': label.get('Confidence', ''),
-                'parents': [parent.get('Name', '') for parent in label.get('Parents', {})]
-            }
-            for label in labels
-        ]
-
-
-class SaveLabels:
-    """Use-case for saving labels to the DynamoDB."""
-
-    def __init__(self, blob_dynamodb_client):
-        self._blob_dynamodb_client = blob_dynamodb_client
+        return list(map(self._transform_label, raw_labels_data.get('Labels')))
 
-    def __call__(self, blob_id, labels):
-        self._blob_dynamodb_client.save_labels(blob_id, labels)
-        return RecognitionStepFunctionResult(
-            blob_id=blob_id,
-            labels=labels
-        )
+    @staticmethod
+    def _transform_label(label):
+        return {
+            'label': label.get('Name', ''),
+            'confidence': label.get('Confidence', ''),
+            'parents': [parent.get('Name', '') for parent in label.get('Parents', ())]
+        }
 
 
 class InvokeCallback:
     """Use-case for invoking callback with recognition result.
 
+    Labels are saved before the callback is invoked, so they aren't lost
+    if the step fails afterwards, and the final recognition status is saved
+    once the callback returns. Both writes happen only while recognition
+    is still in progress, so a retried invocation of already completed
+    recognition neither overwrites the result nor invokes callback again.
+    Result sent to the callback is returned as step output as well.
     If callback invocation was unsuccessful, recognition process still will be
     treated as 'successful'.
 
@@ -198,49 +228,99 @@ class InvokeCallback:
         self._invoker = invoker
 
     def __call__(self, blob_id, labels):
-        blob = self._blob_dynamodb_client.get_blob(blob_id)
-        callback_url = blob.get('callback_url')
+        callback_url = self._blob_dynamodb_client.get_callback_url(blob_id)
         data_to_send = BlobRecognitionResult(
             blob_id=blob_id,
             labels=labels
         )
+        if not self._blob_dynamodb_client.save_labels(blob_id, labels, _IN_PROGRESS):
+            return data_to_send
         status = self._invoker.invoke(callback_url, data_to_send.as_dict())
         if status == self._invoker.SUCCESS:
-            self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.SUCCESS.value)
+            recognition_status = _SUCCESS
         elif status == self._invoker.CALLBACK_FAILURE:
-            self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.FAILED_DUE_TO_CALLBACK_FAILURE.value)
+            recognition_status = _FAILED_DUE_TO_CALLBACK_FAILURE
         elif status == self._invoker.CONNECTION_TIMEOUT:
-            self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.FAILED_DUE_TO_CALLBACK_TIME_OUT.value)
+            recognition_status = _FAILED_DUE_TO_CALLBACK_TIME_OUT
         elif status == self._invoker.CONNECTION_ERROR:
-            self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.FAILED_DUE_TO_CALLBACK_CONNECTION.value)
-        return RecognitionStepFunctionResult(
-            blob_id=blob_id,
-            labels=labels
-        )
+            recognition_status = _FAILED_DUE_TO_CALLBACK_CONNECTION
+        else:
+            raise ValueError('Unknown callback invocation status: {}.'.format(status))
+        self._blob_dynamodb_client.update_status_if(blob_id, recognition_status, _IN_PROGRESS)
+        return data_to_send
 
 
 class Invoker:
-    """Simple service for invoking callback."""
+    """Simple service for invoking callback.
+
+    Only failures that happen before the request is sent (connection timeout,
+    refused connection, failed name resolution) are retried, up to max_attempts
+    times in total, with exponential backoff and full jitter between attempts.
+    Anything else (read timeout, connection reset after sending, 5xx response)
+    ends invocation right away, as callback may have already received the result.
+
+    Timeout is passed to requests as is, so it can be (connect, read) tuple.
+    Invocation then takes roughly up to
+    max_attempts * connect + read + (max_attempts - 1) * backoff_cap seconds,
+    but it is an approximate budget rather than a strict bound: connect timeout
+    applies to each resolved address, name resolution has no timeout and
+    read timeout applies to each socket read, not to the whole response.
+
+    requests is imported on invoker creation, so Lambdas
+    that never invoke callbacks don't load it.
+
+    """
 
     SUCCESS = 0
     CALLBACK_FAILURE = 1
     CONNECTION_TIMEOUT = 2
     CONNECTION_ERROR = 3
 
-    def __init__(self, http_invoke, timeout):
+    def __init__(self, http_invoke, timeout, max_attempts=1, backoff_base=0.1, backoff_cap=2.0, sleep=time.sleep):
+        import requests.exceptions
+        import urllib3.exceptions
+
         self._http_invoke = http_invoke
         self._timeout = timeout
+        self._max_attempts = max_attempts
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._sleep = sleep
+        self._connect_timeout_error = requests.exceptions.ConnectTimeout
+        self._read_timeout_error = requests.exceptions.ReadTimeout
+        self._connection_error = requests.exceptions.ConnectionError
+        self._not_sent_reasons = (urllib3.exceptions.NewConnectionError, ConnectionRefusedError)
 
     def invoke(self, url, data):
+        attempt = 1
+        while True:
+            status, retryable = self._invoke_once(url, data)
+            if not retryable or attempt >= self._max_attempts:
+                return status
+            self._sleep(random.uniform(0, min(self._backoff_cap, self._backoff_base * 2 ** attempt)))
+            attempt += 1
+
+    def _invoke_once(self, url, data):
         try:
             response = self._http_invoke(url, json=data, timeout=self._timeout)
-            if response.status_code == 204:
-                return self.SUCCESS
-            return self.CALLBACK_FAILURE
-        except requests.exceptions.ConnectTimeout:
-            return self.CONNECTION_TIMEOUT
-        except requests.exceptions.ConnectionError:
-            return self.CONNECTION_ERROR
+        except self._connect_timeout_error:
+            return self.CONNECTION_TIMEOUT, True
+        except self._read_timeout_error:
+            return self.CONNECTION_TIMEOUT, False
+        except self._connection_error as e:
+            return self.CONNECTION_ERROR, self._is_not_sent(e)
+        if response.status_code == 204:
+            return self.SUCCESS, False
+        return self.CALLBACK_FAILURE, False
+
+    def _is_not_sent(self, error):
+        """Checks whether connection error has occurred before the request was sent.
+
+        requests wraps urllib3 MaxRetryError, which keeps the actual failure as its reason.
+
+        """
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, self._not_sent_reasons)
 
 
 class HandleUnexpectedError:
@@ -253,53 +333,33 @@ class HandleUnexpectedError:
         self._blob_dynamodb_client = blob_dynamodb_client
 
     def __call__(self, blob_id):
-        self._blob_dynamodb_client.update_status(blob_id, RecognitionStatus.UNEXPECTED_ERROR.value)
+        self._blob_dynamodb_client.update_status(blob_id, _UNEXPECTED_ERROR)
 
 
 class GetRecognitionResult:
     """Use-case for getting recognition result."""
 
+    _FAILURES = {
+        _WAITING_FOR_UPLOAD: BlobIsNotUploadedYet.for_blob,
+        _UPLOAD_TIMED_OUT: BlobUploadTimedOut.for_blob,
+        _IN_PROGRESS: BlobRecognitionIsInProgress.for_blob,
+        _INVALID_BLOB_HAS_BEEN_UPLOADED: InvalidBlobHasBeenUploaded.for_blob,
+        _TOO_LARGE_BLOB_HAS_BEEN_UPLOADED: TooLargeBlobHasBeenUploaded.for_blob,
+        _UNEXPECTED_ERROR: UnexpectedErrorOccurred.for_blob
+    }
+    """dict: Exception factory for each status without available result."""
+
     def __init__(self, blob_dynamodb_client):
         self._blob_dynamodb_client = blob_dynamodb_client
 
     def __call__(self, blob_id):
         blob = self._blob_dynamodb_client.get_blob(blob_id)
         if blob is None:
-            raise BlobWasNotFound(
-                message='Blob not found.',
-                payload={'blob_id': blob_id, 'status': RecognitionStatus.NOT_FOUND.value}
-            )
+            raise BlobWasNotFound.for_blob(blob_id, _NOT_FOUND)
         status = blob.get('status')
-        if status == RecognitionStatus.WAITING_FOR_UPLOAD.value:
-            raise BlobIsNotUploadedYet(
-                message='Blob hasn\'t been uploaded yet.',
-                payload={'blob_id': blob_id, 'status': status}
-            )
-        elif status == RecognitionStatus.UPLOAD_TIMED_OUT.value:
-            raise BlobUploadTimedOut(
-                message='Blob upload is timed out.',
-                payload={'blob_id': blob_id, 'status': status}
-            )
-        elif status == RecognitionStatus.IN_PROGRESS.value:
-            raise BlobRecognitionIsInProgress(
-                message='Recognition is in progress.',
-                payload={'blob_id': blob_id, 'status': status}
-            )
-        elif status == RecognitionStatus.INVALID_BLOB_HAS_BEEN_UPLOADED.value:
-            raise InvalidBlobHasBeenUploaded(
-                message='Invalid image format has been uploaded.',
-                payload={'blob_id': blob_id, 'status': status}
-            )
-        elif status == RecognitionStatus.TOO_LARGE_BLOB_HAS_BEEN_UPLOADED.value:
-            raise TooLargeBlobHasBeenUploaded(
-                message='Too large image has been uploaded.',
-                payload={'blob_id': blob_id, 'status': status}
-            )
-        elif status == RecognitionStatus.UNEXPECTED_ERROR.value:
-            raise UnexpectedErrorOccurred(
-                message='Unexpected error occurred while recognition, try again.',
-                payload={'blob_id': blob_id, 'status': status}
-            )
+        failure = self._FAILURES.get(status)
+        if failure is not None:
+            raise failure(blob_id, status)
         return BlobRecognitionResult(
             blob_id=blob_id,
             labels=blob.get('labels')
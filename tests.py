@@ -1,11 +1,16 @@
 import json
+import threading
+import time
 import unittest
-from collections import namedtuple
-from unittest.mock import Mock
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from unittest.mock import Mock, call, patch
+from uuid import UUID
 
 from botocore.exceptions import ClientError
-from requests import ConnectTimeout, ConnectionError
 
+import app.container
+from app.client import BlobS3Client, BlobDynamoDBClient, BlobStepFunctionClient, BlobRekognitionClient
 from app.container import Container
 from app.domain import RecognitionStatus
 from app.dto import UploadInitializingResult, Dto
@@ -20,31 +25,201 @@ from app.exception import (
     RecognitionStepHasBeenFailed,
     UnexpectedErrorOccurred
 )
-from app.usecase import UrlValidator, Invoker
+from app.lambdas import UUID_POOL_SIZE, uuid_generator
+from app.usecase import (
+    UrlValidator,
+    InitializeUploadListening,
+    CheckUploading,
+    StartRecognition,
+    GetLabels,
+    TransformLabels,
+    InvokeCallback,
+    Invoker,
+    HandleUnexpectedError,
+    GetRecognitionResult
+)
 
 
-ResponseMock = namedtuple('ResponseMock', ['status_code'])
+class ResponseMock:
+    """Stand-in for requests.Response, only status code is used by invoker."""
 
+    __slots__ = ('status_code',)
 
-class TestBlobS3Client(unittest.TestCase):  # pragma: no cover
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+LABELS = [
+    {'label': '1', 'confidence': 100, 'parents': ['foo', 'bar']},
+    {'label': '2', 'confidence': 99.5, 'parents': ['foo']}
+]
+MARSHALLED_LABELS = {
+    'L': [
+        {
+            'M': {
+                'label': {'S': '1'},
+                'confidence': {'N': '100'},
+                'parents': {'L': [{'S': 'foo'}, {'S': 'bar'}]}
+            }
+        },
+        {
+            'M': {
+                'label': {'S': '2'},
+                'confidence': {'N': '99.5'},
+                'parents': {'L': [{'S': 'foo'}]}
+            }
+        }
+    ]
+}
+
+
+EMPTY_DTO = Dto()
+
+
+def frozen(value):
+    """Returns read-only copy of the event: dicts become mapping proxies and lists become tuples, at every level."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: frozen(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(frozen(item) for item in value)
+    return value
+
+
+def dynamodb_key(blob_id):
+    return {'blob_id': {'S': blob_id}}
+
+
+def refused_connection_error():
+    """Returns requests error raised when connection couldn't be established."""
+    from requests import ConnectionError
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+    return ConnectionError(MaxRetryError(None, 'foobar', NewConnectionError(None, 'Connection refused')))
+
+
+def reset_connection_error():
+    """Returns requests error raised when connection was reset after the request was sent."""
+    from requests import ConnectionError
+    from urllib3.exceptions import ProtocolError
+
+    return ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError('Connection reset by peer')))
+
+
+def client_error(code, operation_name='UpdateItem'):
+    """Returns botocore error the way both DynamoDB and DAX clients raise it."""
+    return ClientError({'Error': {'Code': code, 'Message': ''}}, operation_name)
+
+
+def decoded(response):
+    """Returns copy of the HTTP API response with JSON body decoded."""
+    return {**response, 'body': json.loads(response['body'])}
+
+
+class ContainerTestCase(unittest.TestCase):  # pragma: no cover
+    """Base test case with container shared by the whole module.
+
+    Tests replace dependencies of the components they use with mocks
+    for the duration of the test, so components can be built once and reused.
+
+    """
+
+    container = Container(testing_mode=True)
+
+    def mock_dependency(self, component, name, **mock_kwargs):
+        """Replaces dependency of the container component with a mock for the current test.
+
+        Mock is autospecced on the actual dependency, so calls with wrong
+        signature fail. Original dependency is restored on test cleanup,
+        so the shared container doesn't keep mocks of the previous tests.
+
+        Args:
+            component (obj): Component taken from the container.
+            name (str): Attribute name of the dependency.
+            **mock_kwargs: Mock configuration (return_value, side_effect, ...).
+
+        Returns:
+            Mock: Installed mock.
+
+        """
+        patcher = patch.object(component, name, autospec=True, **mock_kwargs)
+        dependency = patcher.start()
+        self.addCleanup(patcher.stop)
+        return dependency
+
+
+class TestContainer(unittest.TestCase):  # pragma: no cover
 
     def setUp(self):
         self.container = Container(testing_mode=True)
-        self.actual_client = Mock()
+
+    def test_warm_up(self):
+        self.container.warm_up('app.handler.get_labels_handler')
+
+        self.assertIn('get_labels_handler', vars(self.container))
+        self.assertIn('blob_rekognition_client', vars(self.container))
+        self.assertNotIn('blob_s3_client', vars(self.container))
+
+    def test_warm_up_unknown_handler(self):
+        self.container.warm_up('app.handler.unknown_handler')
+        self.container.warm_up('')
+
+        self.assertEqual(vars(self.container), {'_testing_mode': True})
+
+    def test_invoker_session_doesnt_keep_cookies(self):
+        from http.client import HTTPMessage
+        from requests import Request
+        from requests.cookies import MockRequest, MockResponse
+
+        cookies = self.container.invoker._http_invoke.__self__.cookies
+        headers = HTTPMessage()
+        headers['Set-Cookie'] = 'session=secret'
+        request = Request('POST', 'http://foo.bar/callback').prepare()
+
+        cookies.extract_cookies(MockResponse(headers), MockRequest(request))
+
+        self.assertEqual(len(cookies), 0)
+
+    def test_dynamodb_client(self):
+        container = Container()
+        with patch.object(app.container, 'DAX_ENDPOINT', None), \
+                patch.object(app.container, 'get_client') as get_client:
+            client = container.blob_dynamodb_client
+
+        get_client.assert_called_once_with('dynamodb')
+        self.assertIs(client._client, get_client.return_value)
+
+    def test_dax_client(self):
+        container = Container()
+        with patch.object(app.container, 'DAX_ENDPOINT', 'dax-endpoint'), \
+                patch.object(app.container, 'get_dax_client') as get_dax_client:
+            client = container.blob_dynamodb_client
+
+        get_dax_client.assert_called_once_with('dax-endpoint')
+        self.assertIs(client._client, get_dax_client.return_value)
+
+
+class TestBlobS3Client(unittest.TestCase):  # pragma: no cover
+
+    @classmethod
+    def setUpClass(cls):
+        cls.actual_client = Mock()
+
+    def setUp(self):
+        self.actual_client.reset_mock(return_value=True, side_effect=True)
         self.bucket = 'bucket'
         self.ttl = 30
         self.key = 'key'
 
     def set_up_client(self):
-        client = self.container.blob_s3_client
-        client._client = self.actual_client
-        client._bucket_name = self.bucket
-        client._ttl = self.ttl
-        return client
+        return BlobS3Client(
+            client=self.actual_client,
+            bucket_name=self.bucket,
+            ttl=self.ttl
+        )
 
     def test_generating_presigned_url(self):
         link = 'link'
-        self.actual_client.generate_presigned_url = Mock(return_value=link)
+        self.actual_client.generate_presigned_url.return_value = link
         client = self.set_up_client()
 
         client.generate_presigned_url(self.key)
@@ -60,45 +235,31 @@ class TestBlobS3Client(unittest.TestCase):  # pragma: no cover
             HttpMethod='PUT'
         )
 
-    def test_is_uploaded_successfully(self):
-        self.actual_client.head_object = Mock(return_value=None)
-        client = self.set_up_client()
-
-        result = client.is_uploaded(self.key)
 
-        self.actual_client.head_object.assert_called_with(
-            Bucket=self.bucket,
-            Key=self.key
-        )
-        self.assertTrue(result)
-
-    def test_is_not_uploaded(self):
-        self.actual_client.head_object = Mock(side_effect=ClientError({}, {}))
-        client = self.set_up_client()
-
-        result = client.is_uploaded(self.key)
-        self.actual_client.head_object.assert_called_with(
-            Bucket=self.bucket,
-            Key=self.key
-        )
-        self.assertFalse(result)
+class TestBlobDynamoDBClient(unittest.TestCase):  # pragma: no cover
 
+    table_name = 'table_name'
+    get_blob_call = call(TableName=table_name, Key=dynamodb_key('blob_id'))
+    get_callback_url_call = call(
+        TableName=table_name,
+        Key=dynamodb_key('blob_id'),
+        ProjectionExpression='callback_url'
+    )
 
-class TestBlobDynamoDBClient(unittest.TestCase):  # pragma: no cover
+    @classmethod
+    def setUpClass(cls):
+        cls.actual_client = Mock()
 
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.actual_client = Mock()
-        self.table_name = 'table_name'
+        self.actual_client.reset_mock(return_value=True, side_effect=True)
 
     def set_up_client(self):
-        client = self.container.blob_dynamodb_client
-        client._client = self.actual_client
-        client._table_name = self.table_name
-        return client
+        return BlobDynamoDBClient(
+            client=self.actual_client,
+            table_name=self.table_name
+        )
 
     def test_create(self):
-        self.actual_client.put_item = Mock()
         client = self.set_up_client()
 
         blob_id = 'blob_id'
@@ -115,8 +276,74 @@ class TestBlobDynamoDBClient(unittest.TestCase):  # pragma: no cover
             }
         )
 
+    def test_create_many(self):
+        items = [('blob_id_{}'.format(i), 'callback_url', 'status') for i in range(30)]
+        expected_requests = [
+            {
+                self.table_name: [
+                    {
+                        'PutRequest': {
+                            'Item': {
+                                'blob_id': {'S': blob_id},
+                                'callback_url': {'S': callback_url},
+                                'status': {'S': status}
+                            }
+                        }
+                    }
+                    for blob_id, callback_url, status in chunk
+                ]
+            }
+            for chunk in (items[:25], items[25:])
+        ]
+        unprocessed = {self.table_name: expected_requests[0][self.table_name][:1]}
+        self.actual_client.batch_write_item.side_effect = [
+            {'UnprocessedItems': unprocessed}, {}, {'UnprocessedItems': {}}
+        ]
+        client = self.set_up_client()
+
+        with patch('app.client.time.sleep') as sleep:
+            result = client.create_many(items)
+
+        self.assertEqual(
+            self.actual_client.batch_write_item.call_args_list,
+            [
+                call(RequestItems=expected_requests[0]),
+                call(RequestItems=unprocessed),
+                call(RequestItems=expected_requests[1])
+            ]
+        )
+        sleep.assert_called_once()
+        self.assertEqual(result, [])
+
+    def test_create_many_with_persistently_unprocessed_items(self):
+        items = [('blob_id_{}'.format(i), 'callback_url', 'status') for i in range(2)]
+        unprocessed = {
+            self.table_name: [
+                {
+                    'PutRequest': {
+                        'Item': {
+                            'blob_id': {'S': 'blob_id_1'},
+                            'callback_url': {'S': 'callback_url'},
+                            'status': {'S': 'status'}
+                        }
+                    }
+                }
+            ]
+        }
+        self.actual_client.batch_write_item.return_value = {'UnprocessedItems': unprocessed}
+        client = self.set_up_client()
+
+        with patch('app.client.time.sleep') as sleep:
+            result = client.create_many(items)
+
+        self.assertEqual(result, ['blob_id_1'])
+        self.assertEqual(self.actual_client.batch_write_item.call_count, 5)
+        self.assertEqual(
+            [delay for (delay,), _ in sleep.call_args_list],
+            [0.05, 0.1, 0.2, 0.4]
+        )
+
     def test_update_status(self):
-        self.actual_client.update_item = Mock()
         client = self.set_up_client()
 
         blob_id = 'blob_id'
@@ -125,7 +352,7 @@ class TestBlobDynamoDBClient(unittest.TestCase):  # pragma: no cover
 
         self.actual_client.update_item.assert_called_with(
             TableName=self.table_name,
-            Key={'blob_id': {'S': blob_id}},
+            Key=dynamodb_key(blob_id),
             UpdateExpression='SET #status = :status',
             ExpressionAttributeValues={
                 ':status': {'S': status}
@@ -135,221 +362,247 @@ class TestBlobDynamoDBClient(unittest.TestCase):  # pragma: no cover
             }
         )
 
-    def test_save_labels(self):
-        self.actual_client.update_item = Mock()
+    def test_update_status_if(self):
         client = self.set_up_client()
 
         blob_id = 'blob_id'
-        labels = [{'label': '1', 'confidence': 100, 'parents': ['foo', 'bar']}]
-        client.save_labels(blob_id, labels)
+        status = 'status'
+        expected_status = 'expected_status'
+        result = client.update_status_if(blob_id, status, expected_status)
 
         self.actual_client.update_item.assert_called_with(
             TableName=self.table_name,
-            Key={'blob_id': {'S': blob_id}},
-            UpdateExpression='SET labels = :labels',
+            Key=dynamodb_key(blob_id),
+            UpdateExpression='SET #status = :status',
+            ConditionExpression='#status = :expected_status',
             ExpressionAttributeValues={
-                ':labels': {
-                    'L': [
-                        {
-                            'M': {
-                                'label': {'S': '1'},
-                                'confidence': {'N': '100'},
-                                'parents': {'L': [{'S': 'foo'}, {'S': 'bar'}]}
-                            }
-                        }
-                    ]
-                }
+                ':status': {'S': status},
+                ':expected_status': {'S': expected_status}
+            },
+            ExpressionAttributeNames={
+                '#status': 'status'
             }
         )
+        self.assertTrue(result)
 
-    def test_get_existing_blob(self):
-        blob_id = 'blob_id'
-        callback_url = 'callback_url'
-        status = 'status'
-        actual_client_result = {
-            'Item': {
-                'blob_id': {'S': blob_id},
-                'callback_url': {'S': callback_url},
-                'status': {'S': status},
-                'labels': {
-                    'L': [
-                        {
-                            'M': {
-                                'label': {'S': '1'},
-                                'confidence': {'N': '100'},
-                                'parents': {'L': [{'S': 'foo'}, {'S': 'bar'}]}
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-        self.actual_client.get_item = Mock(return_value=actual_client_result)
+    def test_update_status_if_unexpected_status(self):
+        self.actual_client.update_item.side_effect = client_error('ConditionalCheckFailedException')
         client = self.set_up_client()
 
-        blob = client.get_blob(blob_id)
+        result = client.update_status_if('blob_id', 'status', 'expected_status')
 
-        self.actual_client.get_item.assert_called_with(
-            TableName=self.table_name,
-            Key={
-                'blob_id': {'S': blob_id}
-            }
-        )
-        self.assertEqual(
-            blob,
-            {
-                'blob_id': blob_id,
-                'callback_url': callback_url,
-                'status': status,
-                'labels': [{'label': '1', 'confidence': 100, 'parents': ['foo', 'bar']}]
-            }
-        )
+        self.assertFalse(result)
 
-    def test_get_missing_blob(self):
-        self.actual_client.get_item = Mock(return_value={})
+    def test_update_status_if_client_error(self):
+        self.actual_client.update_item.side_effect = client_error('ProvisionedThroughputExceededException')
+        client = self.set_up_client()
+
+        with self.assertRaises(ClientError):
+            client.update_status_if('blob_id', 'status', 'expected_status')
+
+    def test_save_labels(self):
         client = self.set_up_client()
 
         blob_id = 'blob_id'
-        blob = client.get_blob(blob_id)
+        expected_status = 'expected_status'
+        result = client.save_labels(blob_id, LABELS, expected_status)
 
-        self.actual_client.get_item.assert_called_with(
+        self.assertTrue(result)
+        self.actual_client.update_item.assert_called_with(
             TableName=self.table_name,
-            Key={
-                'blob_id': {'S': blob_id}
+            Key=dynamodb_key(blob_id),
+            UpdateExpression='SET labels = :labels',
+            ConditionExpression='#status = :expected_status',
+            ExpressionAttributeValues={
+                ':labels': MARSHALLED_LABELS,
+                ':expected_status': {'S': expected_status}
+            },
+            ExpressionAttributeNames={
+                '#status': 'status'
             }
         )
-        self.assertIsNone(blob)
+
+    def test_save_labels_unexpected_status(self):
+        self.actual_client.update_item.side_effect = client_error('ConditionalCheckFailedException')
+        client = self.set_up_client()
+
+        result = client.save_labels('blob_id', [], 'expected_status')
+
+        self.assertFalse(result)
+
+    def test_get_blob(self):
+        item = {
+            'blob_id': {'S': 'blob_id'},
+            'callback_url': {'S': 'callback_url'},
+            'status': {'S': 'status'}
+        }
+        blob = {
+            'blob_id': 'blob_id',
+            'callback_url': 'callback_url',
+            'status': 'status'
+        }
+        cases = [
+            ('existing blob', {'Item': {**item, 'labels': MARSHALLED_LABELS}}, {**blob, 'labels': LABELS}),
+            ('blob without labels', {'Item': item}, {**blob, 'labels': []}),
+            ('missing blob', {}, None)
+        ]
+        client = self.set_up_client()
+        for case, actual_client_result, expected_blob in cases:
+            with self.subTest(case):
+                self.actual_client.get_item.return_value = actual_client_result
+
+                result = client.get_blob('blob_id')
+
+                self.assertEqual(self.actual_client.get_item.call_args, self.get_blob_call)
+                self.assertEqual(result, expected_blob)
+
+    def test_get_callback_url(self):
+        blob_id = 'blob_id'
+        callback_url = 'callback_url'
+        self.actual_client.get_item.return_value = {'Item': {'callback_url': {'S': callback_url}}}
+        client = self.set_up_client()
+
+        result = client.get_callback_url(blob_id)
+
+        self.assertEqual(self.actual_client.get_item.call_args, self.get_callback_url_call)
+        self.assertEqual(result, callback_url)
+
+    def test_get_callback_url_of_missing_blob(self):
+        self.actual_client.get_item.return_value = {}
+        client = self.set_up_client()
+
+        self.assertIsNone(client.get_callback_url('blob_id'))
+        self.assertEqual(self.actual_client.get_item.call_args, self.get_callback_url_call)
 
 
 class TestUploadingStepFunctionClient(unittest.TestCase):  # pragma: no cover
 
+    blob_id = 'blob_id'
+    blob_id_input = json.dumps({'blob_id': blob_id})
+
+    @classmethod
+    def setUpClass(cls):
+        cls.actual_client = Mock()
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.actual_client = Mock()
+        self.actual_client.reset_mock(return_value=True, side_effect=True)
         self.arn = 'arn'
 
     def set_up_client(self):
-        client = self.container.uploading_step_function_client
-        client._client = self.actual_client
-        client._state_machine_arn = self.arn
-        return client
+        return BlobStepFunctionClient(
+            client=self.actual_client,
+            state_machine_arn=self.arn
+        )
 
     def test_launch(self):
-        self.actual_client.start_execution = Mock()
         client = self.set_up_client()
 
-        blob_id = 'blob_id'
-        client.launch(blob_id)
+        client.launch(self.blob_id)
 
         self.actual_client.start_execution.assert_called_with(
             stateMachineArn=self.arn,
-            name=blob_id,
-            input=json.dumps({'blob_id': blob_id})
+            name=self.blob_id,
+            input=self.blob_id_input
         )
 
+    def test_launch_with_blob_id_requiring_escaping(self):
+        client = self.set_up_client()
+
+        blob_id = 'blob "id" \\'
+        client.launch(blob_id)
+
+        _, kwargs = self.actual_client.start_execution.call_args
+        self.assertEqual(json.loads(kwargs['input']), {'blob_id': blob_id})
+
 
 class TestBlobRekognitionClient(unittest.TestCase):  # pragma: no cover
 
+    @classmethod
+    def setUpClass(cls):
+        cls.actual_client = Mock()
+        cls.actual_client.exceptions.InvalidImageFormatException = TypeError
+        cls.actual_client.exceptions.ImageTooLargeException = ValueError
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.actual_client = Mock()
+        self.actual_client.reset_mock(return_value=True, side_effect=True)
         self.bucket = 'bucket'
         self.max_labels = 10
         self.min_confidence = 50
 
     def set_up_client(self):
-        client = self.container.blob_rekognition_client
-        client._client = self.actual_client
-        client._bucket_name = self.bucket
-        client._max_labels = self.max_labels
-        client._min_confidence = self.min_confidence
-        return client
-
-    def test_detect_labels(self):
-        self.actual_client.detect_labels = Mock()
-        client = self.set_up_client()
-
-        blob_id = 'blob_id'
-        client.detect_labels(blob_id)
+        return BlobRekognitionClient(
+            client=self.actual_client,
+            bucket_name=self.bucket,
+            max_labels=self.max_labels,
+            min_confidence=self.min_confidence
+        )
 
-        self.actual_client.detect_labels.assert_called_with(
-            Image={
+    def detect_labels_kwargs(self, blob_id):
+        return {
+            'Image': {
                 'S3Object': {
                     'Bucket': self.bucket,
                     'Name': blob_id
                 }
             },
-            MaxLabels=self.max_labels,
-            MinConfidence=self.min_confidence
-        )
-
-    def test_unsuccessful_labels_detection_due_to_invalid_blob_format(self):
-        self.actual_client.exceptions = Mock()
-        self.actual_client.exceptions.InvalidImageFormatException = TypeError
-        self.actual_client.exceptions.ImageTooLargeException = ValueError
-        self.actual_client.detect_labels = Mock(side_effect=self.actual_client.exceptions.InvalidImageFormatException)
+            'MaxLabels': self.max_labels,
+            'MinConfidence': self.min_confidence
+        }
 
+    def test_detect_labels(self):
         client = self.set_up_client()
 
         blob_id = 'blob_id'
-        with self.assertRaises(InvalidBlobHasBeenUploaded) as cm:
-            client.detect_labels(blob_id)
-        exception = cm.exception
-        self.assertEqual(str(exception), 'Invalid image format has been uploaded.')
-        self.assertEqual(exception.payload, {'blob_id': blob_id})
-        self.actual_client.detect_labels.assert_called_with(
-            Image={
-                'S3Object': {
-                    'Bucket': self.bucket,
-                    'Name': blob_id
-                }
-            },
-            MaxLabels=self.max_labels,
-            MinConfidence=self.min_confidence
-        )
+        client.detect_labels(blob_id)
 
-    def test_unsuccessful_labels_detection_due_to_too_large_blob(self):
-        self.actual_client.exceptions = Mock()
-        self.actual_client.exceptions.InvalidImageFormatException = TypeError
-        self.actual_client.exceptions.ImageTooLargeException = ValueError
-        self.actual_client.detect_labels = Mock(side_effect=self.actual_client.exceptions.ImageTooLargeException)
+        self.actual_client.detect_labels.assert_called_with(**self.detect_labels_kwargs(blob_id))
 
+    def test_unsuccessful_labels_detection(self):
+        cases = [
+            (TypeError, InvalidBlobHasBeenUploaded, 'Invalid image format has been uploaded.'),
+            (ValueError, TooLargeBlobHasBeenUploaded, 'Too large image has been uploaded.')
+        ]
         client = self.set_up_client()
-
         blob_id = 'blob_id'
-        with self.assertRaises(TooLargeBlobHasBeenUploaded) as cm:
-            client.detect_labels(blob_id)
-        exception = cm.exception
-        self.assertEqual(str(exception), 'Too large image has been uploaded.')
-        self.assertEqual(exception.payload, {'blob_id': blob_id})
-        self.actual_client.detect_labels.assert_called_with(
-            Image={
-                'S3Object': {
-                    'Bucket': self.bucket,
-                    'Name': blob_id
-                }
-            },
-            MaxLabels=self.max_labels,
-            MinConfidence=self.min_confidence
-        )
+        for client_exception, expected_exception, expected_message in cases:
+            with self.subTest(expected_exception=expected_exception):
+                self.actual_client.detect_labels.side_effect = client_exception
+
+                with self.assertRaises(expected_exception) as cm:
+                    client.detect_labels(blob_id)
+                exception = cm.exception
+                self.assertEqual(str(exception), expected_message)
+                self.assertEqual(exception.payload, {'blob_id': blob_id})
+                self.actual_client.detect_labels.assert_called_with(**self.detect_labels_kwargs(blob_id))
 
 
 class TestInitializeUploadListening(unittest.TestCase):  # pragma: no cover
 
+    @classmethod
+    def setUpClass(cls):
+        cls.blob_s3_client = Mock(spec_set=BlobS3Client)
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+        cls.uploading_step_function_client = Mock(spec_set=BlobStepFunctionClient)
+        cls.executor = ThreadPoolExecutor(max_workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_s3_client = Mock()
-        self.blob_dynamodb_client = Mock()
-        self.uploading_step_function_client = Mock()
+        self.blob_s3_client.reset_mock(return_value=True, side_effect=True)
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
+        self.uploading_step_function_client.reset_mock(return_value=True, side_effect=True)
         self.validator = UrlValidator()
 
     def set_up_use_case(self):
-        use_case = self.container.initialize_upload_listening
-        use_case._blob_s3_client = self.blob_s3_client
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        use_case._uploading_step_function_client = self.uploading_step_function_client
-        use_case._validator = self.validator
-        return use_case
+        return InitializeUploadListening(
+            blob_s3_client=self.blob_s3_client,
+            blob_dynamodb_client=self.blob_dynamodb_client,
+            uploading_step_function_client=self.uploading_step_function_client,
+            validator=self.validator,
+            executor=self.executor
+        )
 
     def test_passing_in_incorrect_url(self):
         use_case = self.set_up_use_case()
@@ -365,9 +618,7 @@ class TestInitializeUploadListening(unittest.TestCase):  # pragma: no cover
 
     def test_successful_call(self):
         upload_url = 'upload_url'
-        self.blob_dynamodb_client.create = Mock()
-        self.uploading_step_function_client.launch = Mock()
-        self.blob_s3_client.generate_presigned_url = Mock(return_value=upload_url)
+        self.blob_s3_client.generate_presigned_url.return_value = upload_url
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
@@ -388,61 +639,107 @@ class TestInitializeUploadListening(unittest.TestCase):  # pragma: no cover
         self.uploading_step_function_client.launch.assert_called_with(blob_id)
         self.blob_s3_client.generate_presigned_url.assert_called_with(blob_id)
 
+    def test_failed_step_function_launch(self):
+        self.uploading_step_function_client.launch.side_effect = RuntimeError
+        use_case = self.set_up_use_case()
 
-class TestCheckUploading(unittest.TestCase):  # pragma: no cover
+        blob_id = 'blob_id'
+        callback_url = 'http://foo.bar'
+        with self.assertRaises(RuntimeError):
+            use_case(blob_id, callback_url)
 
-    def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_s3_client = Mock()
-        self.blob_dynamodb_client = Mock()
+        self.blob_dynamodb_client.create.assert_called_with(
+            blob_id, callback_url, RecognitionStatus.WAITING_FOR_UPLOAD.value
+        )
 
-    def set_up_use_case(self):
-        use_case = self.container.check_uploading
-        use_case._blob_s3_client = self.blob_s3_client
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        return use_case
-
-    def test_uploaded_blob(self):
-        self.blob_s3_client.is_uploaded = Mock(return_value=True)
-        self.blob_dynamodb_client.update_status = Mock()
+    def test_failed_blob_creation_while_step_function_is_launching(self):
+        creation_failed = threading.Event()
+        launched = threading.Event()
+
+        def launch(blob_id):
+            creation_failed.wait(timeout=5)
+            time.sleep(0.05)
+            launched.set()
+
+        def create(blob_id, callback_url, status):
+            creation_failed.set()
+            raise ValueError
+
+        self.uploading_step_function_client.launch.side_effect = launch
+        self.blob_dynamodb_client.create.side_effect = create
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
-        use_case(blob_id)
+        with self.assertRaises(ValueError):
+            use_case(blob_id, 'http://foo.bar')
+
+        self.assertTrue(launched.is_set())
+        self.uploading_step_function_client.launch.assert_called_with(blob_id)
+        self.blob_s3_client.generate_presigned_url.assert_not_called()
+
+
+class TestUrlValidator(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.validator = UrlValidator()
+
+    def test_valid_urls(self):
+        for url in ('http://foo.bar', 'https://foo.bar/callback?id=1', 'HTTPS://foo.bar'):
+            with self.subTest(url=url):
+                self.assertTrue(self.validator.is_valid_url(url))
+
+    def test_invalid_urls(self):
+        for url in ('', None, 'foobar', 'ftp://foo.bar', 'http://', 'http://foo bar', 'http://foo'):
+            with self.subTest(url=url):
+                self.assertFalse(self.validator.is_valid_url(url))
 
-        self.blob_s3_client.is_uploaded.assert_called_with(blob_id)
-        self.blob_dynamodb_client.update_status.assert_not_called()
 
-    def test_not_uploaded_blob(self):
-        self.blob_s3_client.is_uploaded = Mock(return_value=False)
-        self.blob_dynamodb_client.update_status = Mock()
+class TestCheckUploading(unittest.TestCase):  # pragma: no cover
+
+    @classmethod
+    def setUpClass(cls):
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+
+    def setUp(self):
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
+
+    def set_up_use_case(self):
+        return CheckUploading(
+            blob_dynamodb_client=self.blob_dynamodb_client
+        )
+
+    def test_call(self):
+        self.blob_dynamodb_client.update_status_if.return_value = True
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
         use_case(blob_id)
 
-        self.blob_s3_client.is_uploaded.assert_called_with(blob_id)
-        self.blob_dynamodb_client.update_status.assert_called_with(
-            blob_id, RecognitionStatus.UPLOAD_TIMED_OUT.value
+        self.blob_dynamodb_client.update_status_if.assert_called_with(
+            blob_id,
+            RecognitionStatus.UPLOAD_TIMED_OUT.value,
+            RecognitionStatus.WAITING_FOR_UPLOAD.value
         )
 
 
 class TestStartRecognition(unittest.TestCase):  # pragma: no cover
 
+    @classmethod
+    def setUpClass(cls):
+        cls.recognition_step_function_client = Mock(spec_set=BlobStepFunctionClient)
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.recognition_step_function_client = Mock()
-        self.blob_dynamodb_client = Mock()
+        self.recognition_step_function_client.reset_mock(return_value=True, side_effect=True)
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
 
     def set_up_use_case(self):
-        use_case = self.container.start_recognition
-        use_case._recognition_step_function_client = self.recognition_step_function_client
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        return use_case
+        return StartRecognition(
+            recognition_step_function_client=self.recognition_step_function_client,
+            blob_dynamodb_client=self.blob_dynamodb_client
+        )
 
     def test_call(self):
-        self.blob_dynamodb_client.update_status = Mock()
-        self.recognition_step_function_client.launch = Mock()
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
@@ -456,20 +753,24 @@ class TestStartRecognition(unittest.TestCase):  # pragma: no cover
 
 class TestGetLabels(unittest.TestCase):  # pragma: no cover
 
+    @classmethod
+    def setUpClass(cls):
+        cls.blob_rekognition_client = Mock(spec_set=BlobRekognitionClient)
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_rekognition_client = Mock()
-        self.blob_dynamodb_client = Mock()
+        self.blob_rekognition_client.reset_mock(return_value=True, side_effect=True)
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
 
     def set_up_use_case(self):
-        use_case = self.container.get_labels
-        use_case._blob_rekognition_client = self.blob_rekognition_client
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        return use_case
+        return GetLabels(
+            blob_rekognition_client=self.blob_rekognition_client,
+            blob_dynamodb_client=self.blob_dynamodb_client
+        )
 
     def test_call(self):
         data = 'data'
-        self.blob_rekognition_client.detect_labels = Mock(return_value=data)
+        self.blob_rekognition_client.detect_labels.return_value = data
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
@@ -485,8 +786,7 @@ class TestGetLabels(unittest.TestCase):  # pragma: no cover
         )
 
     def test_unsuccessful_call_due_to_invalid_blob_format(self):
-        self.blob_rekognition_client.detect_labels = Mock(side_effect=InvalidBlobHasBeenUploaded(''))
-        self.blob_dynamodb_client.update_status = Mock()
+        self.blob_rekognition_client.detect_labels.side_effect = InvalidBlobHasBeenUploaded('')
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
@@ -499,8 +799,7 @@ class TestGetLabels(unittest.TestCase):  # pragma: no cover
         )
 
     def test_unsuccessful_call_due_to_too_large_blob(self):
-        self.blob_rekognition_client.detect_labels = Mock(side_effect=TooLargeBlobHasBeenUploaded(''))
-        self.blob_dynamodb_client.update_status = Mock()
+        self.blob_rekognition_client.detect_labels.side_effect = TooLargeBlobHasBeenUploaded('')
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
@@ -515,259 +814,203 @@ class TestGetLabels(unittest.TestCase):  # pragma: no cover
 
 class TestTransformLabels(unittest.TestCase):  # pragma: no cover
 
-    def setUp(self):
-        self.container = Container(testing_mode=True)
-
     def test_call(self):
-        use_case = self.container.transform_labels
+        use_case = TransformLabels()
 
         blob_id = 'blob_id'
         raw_labels_data = {
             'Labels': [
-                {
-                    'Name': 'foo',
-                    'Confidence': 100,
-                    'Parents': [
-                        {'Name': 'bar'}
-                    ]
-                },
-
+                {'Name': '1', 'Confidence': 100, 'Parents': [{'Name': 'foo'}, {'Name': 'bar'}]},
+                {'Name': '2', 'Confidence': 99.5, 'Parents': [{'Name': 'foo'}]}
             ]
         }
         result = use_case(blob_id, raw_labels_data)
 
-        self.assertEqual(
-            {
-                'blob_id': blob_id,
-                'labels': [
-                    {
-                        'label': 'foo',
-                        'confidence': 100,
-                        'parents': ['bar']
-                    }
-                ]
-            },
-            result.as_dict()
-        )
-
-
-class TestSaveLabels(unittest.TestCase):  # pragma: no cover
-
-    def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_dynamodb_client = Mock()
-
-    def set_up_use_case(self):
-        use_case = self.container.save_labels
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        return use_case
-
-    def test_call(self):
-        self.blob_dynamodb_client.save_labels = Mock()
-        use_case = self.set_up_use_case()
-
-        blob_id = 'blob_id'
-        labels = [
-            {
-                'label': 'foo',
-                'confidence': 100,
-                'parents': ['bar']
-            }
-        ]
-
-        result = use_case(blob_id, labels)
-
-        self.blob_dynamodb_client.save_labels.assert_called_with(blob_id, labels)
-        self.assertEqual(
-            {
-                'blob_id': blob_id,
-                'labels': labels
-            },
-            result.as_dict()
-        )
+        self.assertEqual({'blob_id': blob_id, 'labels': LABELS}, result.as_dict())
 
 
 class TestInvoker(unittest.TestCase):  # pragma: no cover
 
     def setUp(self):
-        self.container = Container(testing_mode=True)
         self.http_invoke = Mock()
-        self.timeout = 10
+        self.timeout = (3, 10)
+        self.max_attempts = 3
+        self.sleep = Mock()
 
     def set_up_invoker(self):
-        invoker = self.container.invoker
-        invoker._http_invoke = self.http_invoke
-        invoker._timeout = self.timeout
-        return invoker
-
-    def test_successful_invocation(self):
-        self.http_invoke = Mock(return_value=ResponseMock(status_code=204))
-        invoker = self.set_up_invoker()
+        return Invoker(
+            http_invoke=self.http_invoke,
+            timeout=self.timeout,
+            max_attempts=self.max_attempts,
+            sleep=self.sleep
+        )
 
+    def test_invocation(self):
+        from requests import ConnectTimeout, ReadTimeout
+
+        cases = [
+            ({'return_value': ResponseMock(status_code=204)}, Invoker.SUCCESS, 1),
+            ({'return_value': ResponseMock(status_code=200)}, Invoker.CALLBACK_FAILURE, 1),
+            ({'return_value': ResponseMock(status_code=503)}, Invoker.CALLBACK_FAILURE, 1),
+            ({'side_effect': ConnectTimeout}, Invoker.CONNECTION_TIMEOUT, self.max_attempts),
+            ({'side_effect': ReadTimeout}, Invoker.CONNECTION_TIMEOUT, 1),
+            ({'side_effect': refused_connection_error()}, Invoker.CONNECTION_ERROR, self.max_attempts),
+            ({'side_effect': reset_connection_error()}, Invoker.CONNECTION_ERROR, 1)
+        ]
         url = 'foobar'
         data = {'baz': 'egg'}
-        status = invoker.invoke(url, data)
-
-        self.http_invoke.assert_called_with(url, json=data, timeout=self.timeout)
-        self.assertEqual(status, invoker.SUCCESS)
+        for http_invoke_behaviour, expected_status, expected_attempts in cases:
+            with self.subTest(http_invoke_behaviour=http_invoke_behaviour):
+                self.http_invoke = Mock(**http_invoke_behaviour)
+                self.sleep = Mock()
+                invoker = self.set_up_invoker()
 
-    def test_failed_invocation_due_to_callback_failure(self):
-        self.http_invoke = Mock(return_value=ResponseMock(status_code=200))
-        invoker = self.set_up_invoker()
+                status = invoker.invoke(url, data)
 
-        url = 'foobar'
-        data = {'baz': 'egg'}
-        status = invoker.invoke(url, data)
+                self.http_invoke.assert_called_with(url, json=data, timeout=self.timeout)
+                self.assertEqual(status, expected_status)
+                self.assertEqual(self.http_invoke.call_count, expected_attempts)
+                self.assertEqual(self.sleep.call_count, expected_attempts - 1)
 
-        self.http_invoke.assert_called_with(url, json=data, timeout=self.timeout)
-        self.assertEqual(status, invoker.CALLBACK_FAILURE)
+    def test_successful_invocation_after_retry(self):
+        from requests import ConnectTimeout
 
-    def test_failed_invocation_due_to_connection_timeout(self):
-        self.http_invoke = Mock(side_effect=ConnectTimeout)
+        self.http_invoke = Mock(side_effect=[refused_connection_error(), ConnectTimeout, ResponseMock(status_code=204)])
         invoker = self.set_up_invoker()
 
-        url = 'foobar'
-        data = {'baz': 'egg'}
-        status = invoker.invoke(url, data)
+        status = invoker.invoke('foobar', {'baz': 'egg'})
 
-        self.http_invoke.assert_called_with(url, json=data, timeout=self.timeout)
-        self.assertEqual(status, invoker.CONNECTION_TIMEOUT)
+        self.assertEqual(status, invoker.SUCCESS)
+        self.assertEqual(self.http_invoke.call_count, 3)
+        for (delay,), _ in self.sleep.call_args_list:
+            self.assertLessEqual(delay, invoker._backoff_cap)
 
-    def test_failed_invocation_due_to_connection_error(self):
-        self.http_invoke = Mock(side_effect=ConnectionError)
+    def test_connection_reset_after_sending_is_not_retried(self):
+        self.http_invoke = Mock(side_effect=[reset_connection_error(), ResponseMock(status_code=204)])
         invoker = self.set_up_invoker()
 
-        url = 'foobar'
-        data = {'baz': 'egg'}
-        status = invoker.invoke(url, data)
+        status = invoker.invoke('foobar', {'baz': 'egg'})
 
-        self.http_invoke.assert_called_with(url, json=data, timeout=self.timeout)
         self.assertEqual(status, invoker.CONNECTION_ERROR)
+        self.assertEqual(self.http_invoke.call_count, 1)
+        self.sleep.assert_not_called()
 
 
 class TestInvokeCallback(unittest.TestCase):  # pragma: no cover
 
+    @classmethod
+    def setUpClass(cls):
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+        cls.invoker = Mock(spec_set=Invoker)
+        cls.invoker.SUCCESS = Invoker.SUCCESS
+        cls.invoker.CALLBACK_FAILURE = Invoker.CALLBACK_FAILURE
+        cls.invoker.CONNECTION_TIMEOUT = Invoker.CONNECTION_TIMEOUT
+        cls.invoker.CONNECTION_ERROR = Invoker.CONNECTION_ERROR
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_dynamodb_client = Mock()
-        self.invoker = Mock()
-        self.invoker.SUCCESS = Invoker.SUCCESS
-        self.invoker.CALLBACK_FAILURE = Invoker.CALLBACK_FAILURE
-        self.invoker.CONNECTION_TIMEOUT = Invoker.CONNECTION_TIMEOUT
-        self.invoker.CONNECTION_ERROR = Invoker.CONNECTION_ERROR
-        self.blob = {
-            'blob_id': 'blob_id',
-            'callback_url': 'callback_url'
-        }
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
+        self.invoker.reset_mock(return_value=True, side_effect=True)
+        self.callback_url = 'callback_url'
 
     def set_up_use_case(self):
-        use_case = self.container.invoke_callback
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        use_case._invoker = self.invoker
-        return use_case
-
-    def test_successful_invocation(self):
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        self.blob_dynamodb_client.update_status = Mock()
-        self.invoker.invoke = Mock(return_value=Invoker.SUCCESS)
+        return InvokeCallback(
+            blob_dynamodb_client=self.blob_dynamodb_client,
+            invoker=self.invoker
+        )
 
+    def test_invocation(self):
+        cases = [
+            (Invoker.SUCCESS, RecognitionStatus.SUCCESS),
+            (Invoker.CALLBACK_FAILURE, RecognitionStatus.FAILED_DUE_TO_CALLBACK_FAILURE),
+            (Invoker.CONNECTION_TIMEOUT, RecognitionStatus.FAILED_DUE_TO_CALLBACK_TIME_OUT),
+            (Invoker.CONNECTION_ERROR, RecognitionStatus.FAILED_DUE_TO_CALLBACK_CONNECTION)
+        ]
         blob_id = 'blob_id'
         labels = []
         use_case = self.set_up_use_case()
+        self.blob_dynamodb_client.get_callback_url.return_value = self.callback_url
+        self.blob_dynamodb_client.save_labels.return_value = True
+        for invocation_status, recognition_status in cases:
+            with self.subTest(recognition_status=recognition_status):
+                self.invoker.invoke.return_value = invocation_status
 
-        result = use_case(blob_id, labels)
+                result = use_case(blob_id, labels)
 
-        self.blob_dynamodb_client.get_blob.assert_called_with(blob_id)
-        self.invoker.invoke.assert_called_with('callback_url', {'blob_id': blob_id, 'labels': labels})
-        self.blob_dynamodb_client.update_status.assert_called_with(blob_id, RecognitionStatus.SUCCESS.value)
-        self.assertEqual(
-            {
-                'blob_id': blob_id,
-                'labels': labels
-            },
-            result.as_dict()
-        )
-
-    def test_failed_invocation_due_to_callback_failure(self):
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        self.blob_dynamodb_client.update_status = Mock()
-        self.invoker.invoke = Mock(return_value=Invoker.CALLBACK_FAILURE)
+                self.blob_dynamodb_client.get_callback_url.assert_called_with(blob_id)
+                self.blob_dynamodb_client.save_labels.assert_called_with(
+                    blob_id, labels, RecognitionStatus.IN_PROGRESS.value
+                )
+                self.invoker.invoke.assert_called_with('callback_url', {'blob_id': blob_id, 'labels': labels})
+                self.blob_dynamodb_client.update_status_if.assert_called_with(
+                    blob_id, recognition_status.value, RecognitionStatus.IN_PROGRESS.value
+                )
+                self.assertEqual(
+                    {
+                        'blob_id': blob_id,
+                        'labels': labels
+                    },
+                    result.as_dict()
+                )
 
+    def test_labels_are_saved_before_failed_status_update(self):
+        self.blob_dynamodb_client.get_callback_url.return_value = self.callback_url
+        self.blob_dynamodb_client.save_labels.return_value = True
+        self.blob_dynamodb_client.update_status_if.side_effect = client_error('ProvisionedThroughputExceededException')
         blob_id = 'blob_id'
-        labels = []
-        use_case = self.set_up_use_case()
 
-        result = use_case(blob_id, labels)
+        def invoke(url, data):
+            self.blob_dynamodb_client.save_labels.assert_called_once_with(
+                blob_id, LABELS, RecognitionStatus.IN_PROGRESS.value
+            )
+            return Invoker.SUCCESS
 
-        self.blob_dynamodb_client.get_blob.assert_called_with(blob_id)
-        self.invoker.invoke.assert_called_with('callback_url', {'blob_id': blob_id, 'labels': labels})
-        self.blob_dynamodb_client.update_status.assert_called_with(blob_id, RecognitionStatus.FAILED_DUE_TO_CALLBACK_FAILURE.value)
-        self.assertEqual(
-            {
-                'blob_id': blob_id,
-                'labels': labels
-            },
-            result.as_dict()
-        )
+        self.invoker.invoke.side_effect = invoke
+        use_case = self.set_up_use_case()
 
-    def test_failed_invocation_due_to_connection_timeout(self):
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        self.blob_dynamodb_client.update_status = Mock()
-        self.invoker.invoke = Mock(return_value=Invoker.CONNECTION_TIMEOUT)
+        with self.assertRaises(ClientError):
+            use_case(blob_id, LABELS)
 
-        blob_id = 'blob_id'
-        labels = []
+        self.invoker.invoke.assert_called_once_with(self.callback_url, {'blob_id': blob_id, 'labels': LABELS})
+
+    def test_unknown_invocation_status(self):
+        self.blob_dynamodb_client.get_callback_url.return_value = self.callback_url
+        self.blob_dynamodb_client.save_labels.return_value = True
+        self.invoker.invoke.return_value = -1
         use_case = self.set_up_use_case()
 
-        result = use_case(blob_id, labels)
+        with self.assertRaises(ValueError):
+            use_case('blob_id', LABELS)
 
-        self.blob_dynamodb_client.get_blob.assert_called_with(blob_id)
-        self.invoker.invoke.assert_called_with('callback_url', {'blob_id': blob_id, 'labels': labels})
-        self.blob_dynamodb_client.update_status.assert_called_with(blob_id, RecognitionStatus.FAILED_DUE_TO_CALLBACK_TIME_OUT.value)
-        self.assertEqual(
-            {
-                'blob_id': blob_id,
-                'labels': labels
-            },
-            result.as_dict()
-        )
+        self.blob_dynamodb_client.update_status_if.assert_not_called()
 
-    def test_failed_invocation_due_to_connection_error(self):
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        self.blob_dynamodb_client.update_status = Mock()
-        self.invoker.invoke = Mock(return_value=Invoker.CONNECTION_ERROR)
+    def test_invocation_of_completed_recognition(self):
+        self.blob_dynamodb_client.get_callback_url.return_value = self.callback_url
+        self.blob_dynamodb_client.save_labels.return_value = False
+        use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
-        labels = []
-        use_case = self.set_up_use_case()
+        result = use_case(blob_id, LABELS)
 
-        result = use_case(blob_id, labels)
-
-        self.blob_dynamodb_client.get_blob.assert_called_with(blob_id)
-        self.invoker.invoke.assert_called_with('callback_url', {'blob_id': blob_id, 'labels': labels})
-        self.blob_dynamodb_client.update_status.assert_called_with(blob_id, RecognitionStatus.FAILED_DUE_TO_CALLBACK_CONNECTION.value)
-        self.assertEqual(
-            {
-                'blob_id': blob_id,
-                'labels': labels
-            },
-            result.as_dict()
-        )
+        self.invoker.invoke.assert_not_called()
+        self.blob_dynamodb_client.update_status_if.assert_not_called()
+        self.assertEqual({'blob_id': blob_id, 'labels': LABELS}, result.as_dict())
 
 
 class TestHandleUnexpectedError(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_dynamodb_client = Mock()
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
 
     def set_up_use_case(self):
-        use_case = self.container.handle_unexpected_error
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        return use_case
+        return HandleUnexpectedError(
+            blob_dynamodb_client=self.blob_dynamodb_client
+        )
 
     def test_invocation(self):
-        self.blob_dynamodb_client.update_status = Mock()
         use_case = self.set_up_use_case()
 
         blob_id = 'blob_id'
@@ -778,210 +1021,112 @@ class TestHandleUnexpectedError(unittest.TestCase):
 
 class TestGetRecognitionResult(unittest.TestCase):  # pragma: no cover
 
+    @classmethod
+    def setUpClass(cls):
+        cls.blob_dynamodb_client = Mock(spec_set=BlobDynamoDBClient)
+
     def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.blob_dynamodb_client = Mock()
+        self.blob_dynamodb_client.reset_mock(return_value=True, side_effect=True)
         self.blob = {
             'blob_id': 'blob_id',
             'labels': []
         }
 
     def set_up_use_case(self):
-        use_case = self.container.get_recognition_result
-        use_case._blob_dynamodb_client = self.blob_dynamodb_client
-        return use_case
-
-    def test_successful_result_retrieving(self):
-        self.blob['status'] = RecognitionStatus.SUCCESS.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        result = use_case('blob_id')
-
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'labels': []},
-            result.as_dict()
-        )
-
-    def test_successful_result_retrieving_but_callback_failed(self):
-        self.blob['status'] = RecognitionStatus.FAILED_DUE_TO_CALLBACK_FAILURE.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        result = use_case('blob_id')
-
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'labels': []},
-            result.as_dict()
-        )
-
-    def test_successful_result_retrieving_but_callback_failed_due_to_time_out(self):
-        self.blob['status'] = RecognitionStatus.FAILED_DUE_TO_CALLBACK_TIME_OUT.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        result = use_case('blob_id')
-
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'labels': []},
-            result.as_dict()
-        )
-
-    def test_successful_result_retrieving_but_callback_failed_due_to_connection(self):
-        self.blob['status'] = RecognitionStatus.FAILED_DUE_TO_CALLBACK_CONNECTION.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        result = use_case('blob_id')
-
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'labels': []},
-            result.as_dict()
-        )
-
-    def test_unsuccessful_result_retrieving_for_non_existent_blob(self):
-        self.blob_dynamodb_client.get_blob = Mock(return_value=None)
-        use_case = self.set_up_use_case()
-
-        with self.assertRaises(BlobWasNotFound) as cm:
-            use_case('blob_id')
-
-        exception = cm.exception
-        self.assertEqual('Blob not found.', str(exception))
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.NOT_FOUND.value},
-            exception.payload
-        )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-
-    def test_unsuccessful_result_retrieving_for_blob_waiting_for_upload(self):
-        self.blob['status'] = RecognitionStatus.WAITING_FOR_UPLOAD.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        with self.assertRaises(BlobIsNotUploadedYet) as cm:
-            use_case('blob_id')
-
-        exception = cm.exception
-        self.assertEqual('Blob hasn\'t been uploaded yet.', str(exception))
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.WAITING_FOR_UPLOAD.value},
-            exception.payload
-        )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-
-    def test_unsuccessful_result_retrieving_for_blob_with_timed_out_upload(self):
-        self.blob['status'] = RecognitionStatus.UPLOAD_TIMED_OUT.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        with self.assertRaises(BlobUploadTimedOut) as cm:
-            use_case('blob_id')
-
-        exception = cm.exception
-        self.assertEqual('Blob upload is timed out.', str(exception))
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.UPLOAD_TIMED_OUT.value},
-            exception.payload
+        return GetRecognitionResult(
+            blob_dynamodb_client=self.blob_dynamodb_client
         )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-
-    def test_unsuccessful_result_retrieving_for_blob_in_progress(self):
-        self.blob['status'] = RecognitionStatus.IN_PROGRESS.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        with self.assertRaises(BlobRecognitionIsInProgress) as cm:
-            use_case('blob_id')
 
-        exception = cm.exception
-        self.assertEqual('Recognition is in progress.', str(exception))
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.IN_PROGRESS.value},
-            exception.payload
-        )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
+    def assert_status_raises(self, status, exception_class, message):
+        self.blob_dynamodb_client.reset_mock()
+        self.blob['status'] = status.value
+        self.blob_dynamodb_client.get_blob.return_value = self.blob
+        self.assert_use_case_raises(exception_class, message, status.value)
 
-    def test_unsuccessful_result_retrieving_for_invalid_uploaded_blob(self):
-        self.blob['status'] = RecognitionStatus.INVALID_BLOB_HAS_BEEN_UPLOADED.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
+    def assert_use_case_raises(self, exception_class, message, status):
         use_case = self.set_up_use_case()
 
-        with self.assertRaises(InvalidBlobHasBeenUploaded) as cm:
+        with self.assertRaises(exception_class) as cm:
             use_case('blob_id')
 
         exception = cm.exception
-        self.assertEqual('Invalid image format has been uploaded.', str(exception))
         self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.INVALID_BLOB_HAS_BEEN_UPLOADED.value},
-            exception.payload
-        )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
-
-    def test_unsuccessful_result_retrieving_for_too_large_blob(self):
-        self.blob['status'] = RecognitionStatus.TOO_LARGE_BLOB_HAS_BEEN_UPLOADED.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
-        use_case = self.set_up_use_case()
-
-        with self.assertRaises(TooLargeBlobHasBeenUploaded) as cm:
-            use_case('blob_id')
-
-        exception = cm.exception
-        self.assertEqual('Too large image has been uploaded.', str(exception))
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.TOO_LARGE_BLOB_HAS_BEEN_UPLOADED.value},
-            exception.payload
+            {
+                'message': message,
+                'payload': {'blob_id': 'blob_id', 'status': status},
+                'get_blob_calls': [call('blob_id')]
+            },
+            {
+                'message': str(exception),
+                'payload': exception.payload,
+                'get_blob_calls': self.blob_dynamodb_client.get_blob.call_args_list
+            }
         )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
 
-    def test_unsuccessful_result_retrieving_due_to_unexpected_error(self):
-        self.blob['status'] = RecognitionStatus.UNEXPECTED_ERROR.value
-        self.blob_dynamodb_client.get_blob = Mock(return_value=self.blob)
+    def test_successful_result_retrieving(self):
+        statuses = [
+            RecognitionStatus.SUCCESS,
+            RecognitionStatus.FAILED_DUE_TO_CALLBACK_FAILURE,
+            RecognitionStatus.FAILED_DUE_TO_CALLBACK_TIME_OUT,
+            RecognitionStatus.FAILED_DUE_TO_CALLBACK_CONNECTION
+        ]
         use_case = self.set_up_use_case()
+        for status in statuses:
+            with self.subTest(status=status):
+                self.blob_dynamodb_client.reset_mock()
+                self.blob['status'] = status.value
+                self.blob_dynamodb_client.get_blob.return_value = self.blob
+
+                result = use_case('blob_id')
+
+                self.blob_dynamodb_client.get_blob.assert_called_once_with('blob_id')
+                self.assertEqual(
+                    {'blob_id': 'blob_id', 'labels': []},
+                    result.as_dict()
+                )
 
-        with self.assertRaises(UnexpectedErrorOccurred) as cm:
-            use_case('blob_id')
-
-        exception = cm.exception
-        self.assertEqual('Unexpected error occurred while recognition, try again.', str(exception))
-        self.assertEqual(
-            {'blob_id': 'blob_id', 'status': RecognitionStatus.UNEXPECTED_ERROR.value},
-            exception.payload
-        )
-        self.blob_dynamodb_client.get_blob.assert_called_with('blob_id')
+    def test_unsuccessful_result_retrieving_for_non_existent_blob(self):
+        self.blob_dynamodb_client.get_blob.return_value = None
+
+        self.assert_use_case_raises(BlobWasNotFound, 'Blob not found.', RecognitionStatus.NOT_FOUND.value)
+
+    def test_unsuccessful_result_retrieving_for_unavailable_result(self):
+        cases = [
+            (RecognitionStatus.WAITING_FOR_UPLOAD, BlobIsNotUploadedYet, 'Blob hasn\'t been uploaded yet.'),
+            (RecognitionStatus.UPLOAD_TIMED_OUT, BlobUploadTimedOut, 'Blob upload is timed out.'),
+            (RecognitionStatus.IN_PROGRESS, BlobRecognitionIsInProgress, 'Recognition is in progress.'),
+            (RecognitionStatus.INVALID_BLOB_HAS_BEEN_UPLOADED, InvalidBlobHasBeenUploaded, 'Invalid image format has been uploaded.'),
+            (RecognitionStatus.TOO_LARGE_BLOB_HAS_BEEN_UPLOADED, TooLargeBlobHasBeenUploaded, 'Too large image has been uploaded.'),
+            (RecognitionStatus.UNEXPECTED_ERROR, UnexpectedErrorOccurred, 'Unexpected error occurred while recognition, try again.')
+        ]
+        for status, exception_class, message in cases:
+            with self.subTest(status=status):
+                self.assert_status_raises(status, exception_class, message)
 
 
-class TestInitializeUploadListeningLambda(unittest.TestCase):  # pragma: no cover
+class TestInitializeUploadListeningLambda(ContainerTestCase):  # pragma: no cover
 
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+    blob_id = 'blob_id'
+    callback_url = 'callback_url'
+    event = frozen({'body': json.dumps({'callback_url': callback_url})})
 
     def test_successful_initializing(self):
-        blob_id = 'blob_id'
-        callback_url = 'callback_url'
+        blob_id = self.blob_id
+        callback_url = self.callback_url
         upload_url = 'upload_url'
         initialize_upload_listening_handler = self.container.initialize_upload_listening_handler
-        initialize_upload_listening_handler._id_generator = Mock(
-            return_value=blob_id
-        )
-        initialize_upload_listening_handler._initialize_upload_listening = Mock(
-            return_value=(
-                UploadInitializingResult(
-                    blob_id=blob_id,
-                    upload_url=upload_url,
-                    callback_url=callback_url
-                )
+        id_generator = self.mock_dependency(initialize_upload_listening_handler, '_id_generator', return_value=blob_id)
+        initialize_upload_listening = self.mock_dependency(
+            initialize_upload_listening_handler,
+            '_initialize_upload_listening',
+            return_value=UploadInitializingResult(
+                blob_id=blob_id,
+                upload_url=upload_url,
+                callback_url=callback_url
             )
         )
 
-        body = json.dumps({'callback_url': callback_url})
-        result = initialize_upload_listening_handler.handle(
-            {'body': body}, {}
-        )
+        result = initialize_upload_listening_handler.handle(self.event, {})
 
         self.assertEqual(
             {
@@ -994,27 +1139,26 @@ class TestInitializeUploadListeningLambda(unittest.TestCase):  # pragma: no cove
                     'upload_url': upload_url
                 })
             },
-            {**result, 'body': json.loads(result['body'])}
+            decoded(result)
         )
-        initialize_upload_listening_handler._id_generator.assert_called_with()
-        initialize_upload_listening_handler._initialize_upload_listening.assert_called_with(blob_id, callback_url)
+        id_generator.assert_called_with()
+        initialize_upload_listening.assert_called_with(blob_id, callback_url)
 
     def test_unsuccessful_upload_initializing(self):
-        blob_id = 'blob_id'
-        callback_url = 'callback_url'
+        blob_id = self.blob_id
+        callback_url = self.callback_url
         initialize_upload_listening_handler = self.container.initialize_upload_listening_handler
-        initialize_upload_listening_handler._id_generator = Mock(
-            return_value=blob_id
-        )
-        initialize_upload_listening_handler._initialize_upload_listening = Mock(
+        id_generator = self.mock_dependency(initialize_upload_listening_handler, '_id_generator', return_value=blob_id)
+        initialize_upload_listening = self.mock_dependency(
+            initialize_upload_listening_handler,
+            '_initialize_upload_listening',
             side_effect=CallbackUrlIsNotValid(
                 message='Invalid callback url supplied.',
                 payload={'callback_url': callback_url}
             )
         )
 
-        body = json.dumps({'callback_url': callback_url})
-        result = initialize_upload_listening_handler.handle({'body': body}, {})
+        result = initialize_upload_listening_handler.handle(self.event, {})
 
         self.assertEqual(
             {
@@ -1026,195 +1170,151 @@ class TestInitializeUploadListeningLambda(unittest.TestCase):  # pragma: no cove
                     'payload': {'callback_url': callback_url}
                 }
             },
-            {**result, 'body': json.loads(result['body'])}
+            decoded(result)
         )
-        initialize_upload_listening_handler._id_generator.assert_called_with()
-        initialize_upload_listening_handler._initialize_upload_listening.assert_called_with(blob_id, callback_url)
+        id_generator.assert_called_with()
+        initialize_upload_listening.assert_called_with(blob_id, callback_url)
 
 
-class TestCheckUploadingHandler(unittest.TestCase):  # pragma: no cover
-
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+class TestCheckUploadingHandler(ContainerTestCase):  # pragma: no cover
 
     def test_invocation(self):
         check_uploading_handler = self.container.check_uploading_handler
-        check_uploading_handler._check_uploading = Mock()
+        check_uploading = self.mock_dependency(check_uploading_handler, '_check_uploading')
 
         blob_id = 'blob_id'
         event = {'blob_id': blob_id}
         check_uploading_handler.handle(event, {})
 
-        check_uploading_handler._check_uploading.assert_called_with(blob_id)
+        check_uploading.assert_called_with(blob_id)
 
 
-class TestImageHasBeenUploadedHandler(unittest.TestCase):  # pragma: no cover
+class TestImageHasBeenUploadedHandler(ContainerTestCase):  # pragma: no cover
 
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+    blob_id = 'blob_id'
+    event = frozen({'Records': [
+        {
+            's3': {
+                'object': {
+                    'key': blob_id
+                }
+            }
+        }
+    ]})
 
     def test_invocation(self):
         image_has_been_uploaded_handler = self.container.image_has_been_uploaded_handler
-        image_has_been_uploaded_handler._start_recognition = Mock()
-
-        blob_id = 'blob_id'
-        event = {'Records': [
-            {
-                's3': {
-                    'object': {
-                        'key': blob_id
-                    }
-                }
-            }
-        ]}
-        image_has_been_uploaded_handler.handle(event, {})
+        start_recognition = self.mock_dependency(image_has_been_uploaded_handler, '_start_recognition')
 
-        image_has_been_uploaded_handler._start_recognition.assert_called_with(blob_id)
+        image_has_been_uploaded_handler.handle(self.event, {})
 
+        start_recognition.assert_called_with(self.blob_id)
 
-class TestGetLabelsHandler(unittest.TestCase):  # pragma: no cover
 
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+class TestGetLabelsHandler(ContainerTestCase):  # pragma: no cover
 
     def test_invocation(self):
         get_labels_handler = self.container.get_labels_handler
-        get_labels_handler._get_labels = Mock(return_value=Dto())
+        get_labels = self.mock_dependency(get_labels_handler, '_get_labels', return_value=EMPTY_DTO)
 
         blob_id = 'blob_id'
         event = {'blob_id': blob_id}
         get_labels_handler.handle(event, {})
 
-        get_labels_handler._get_labels.assert_called_with(blob_id)
+        get_labels.assert_called_with(blob_id)
 
 
-class TestTransformLabelsHandler(unittest.TestCase):  # pragma: no cover
-
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+class TestTransformLabelsHandler(ContainerTestCase):  # pragma: no cover
 
     def test_invocation(self):
         transform_labels_handler = self.container.transform_labels_handler
-        transform_labels_handler._transform_labels = Mock(return_value=Dto())
+        transform_labels = self.mock_dependency(transform_labels_handler, '_transform_labels', return_value=EMPTY_DTO)
 
         blob_id = 'blob_id'
         labels = []
         event = {'blob_id': blob_id, 'labels': labels}
         transform_labels_handler.handle(event, {})
 
-        transform_labels_handler._transform_labels.assert_called_with(blob_id, labels)
+        transform_labels.assert_called_with(blob_id, labels)
 
 
-class TestSaveLabelsHandler(unittest.TestCase):  # pragma: no cover
-
-    def setUp(self):
-        self.container = Container(testing_mode=True)
-
-    def test_invocation(self):
-        save_labels_handler = self.container.save_labels_handler
-        save_labels_handler._save_labels = Mock(return_value=Dto())
-
-        blob_id = 'blob_id'
-        labels = []
-        event = {'blob_id': blob_id, 'labels': labels}
-        save_labels_handler.handle(event, {})
-
-        save_labels_handler._save_labels.assert_called_with(blob_id, labels)
-
-
-class TestInvokeCallbackHandler(unittest.TestCase):  # pragma: no cover
-
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+class TestInvokeCallbackHandler(ContainerTestCase):  # pragma: no cover
 
     def test_invocation(self):
         invoke_callback_handler = self.container.invoke_callback_handler
-        invoke_callback_handler._invoke_callback = Mock(return_value=Dto())
+        invoke_callback = self.mock_dependency(invoke_callback_handler, '_invoke_callback', return_value=EMPTY_DTO)
 
         blob_id = 'blob_id'
         labels = []
         event = {'blob_id': blob_id, 'labels': labels}
         invoke_callback_handler.handle(event, {})
 
-        invoke_callback_handler._invoke_callback.assert_called_with(blob_id, labels)
+        invoke_callback.assert_called_with(blob_id, labels)
 
 
-class TestGetRecognitionResultHandler(unittest.TestCase):  # pragma: no cover
+class TestGetRecognitionResultHandler(ContainerTestCase):  # pragma: no cover
 
-    def setUp(self):
-        self.container = Container(testing_mode=True)
+    blob_id = 'blob_id'
+    event = frozen({'pathParameters': {'blob_id': blob_id}})
+    expected_ok_response = {
+        'isBase64Encoded': False,
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': {}
+    }
+    expected_not_found_response = {
+        'isBase64Encoded': False,
+        'statusCode': 404,
+        'headers': {'Content-Type': 'application/json'},
+        'body': {'description': '', 'payload': {}}
+    }
 
     def test_successful_invocation(self):
         get_recognition_result_handler = self.container.get_recognition_result_handler
-        get_recognition_result_handler._get_recognition_result = Mock(return_value=Dto())
+        get_recognition_result = self.mock_dependency(get_recognition_result_handler, '_get_recognition_result', return_value=EMPTY_DTO)
 
-        blob_id = 'blob_id'
-        event = {
-            'pathParameters': {
-                'blob_id': blob_id
-            }
-        }
-        result = get_recognition_result_handler.handle(event, {})
+        result = get_recognition_result_handler.handle(self.event, {})
 
-        get_recognition_result_handler._get_recognition_result.assert_called_with(blob_id)
-        self.assertEqual(
-            {
-                'isBase64Encoded': False,
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json'},
-                'body': {}
-            },
-            {**result, 'body': json.loads(result['body'])}
-        )
+        get_recognition_result.assert_called_with(self.blob_id)
+        self.assertEqual(self.expected_ok_response, decoded(result))
 
     def test_unsuccessful_invocation(self):
         get_recognition_result_handler = self.container.get_recognition_result_handler
-        get_recognition_result_handler._get_recognition_result = Mock(side_effect=BlobWasNotFound(''))
+        get_recognition_result = self.mock_dependency(get_recognition_result_handler, '_get_recognition_result', side_effect=BlobWasNotFound(''))
 
-        blob_id = 'blob_id'
-        event = {
-            'pathParameters': {
-                'blob_id': blob_id
-            }
-        }
+        result = get_recognition_result_handler.handle(self.event, {})
 
-        result = get_recognition_result_handler.handle(event, {})
-
-        get_recognition_result_handler._get_recognition_result.assert_called_with(blob_id)
-        self.assertEqual(
-            {
-                'isBase64Encoded': False,
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json'},
-                'body': {'description': '', 'payload': {}}
-            },
-            {**result, 'body': json.loads(result['body'])}
-        )
+        get_recognition_result.assert_called_with(self.blob_id)
+        self.assertEqual(self.expected_not_found_response, decoded(result))
 
 
-class TestUnexpectedErrorFallbackHandler(unittest.TestCase):
-
-    def setUp(self):
-        self.container = Container(testing_mode=True)
-        self.handle_unexpected_error = Mock()
-
-    def set_up_handler(self):
-        handler = self.container.unexpected_error_fallback_handler
-        handler._handle_unexpected_error = self.handle_unexpected_error
-        return handler
+class TestUnexpectedErrorFallbackHandler(ContainerTestCase):  # pragma: no cover
 
     def test_successful_handling(self):
-        handler = self.set_up_handler()
+        handler = self.container.unexpected_error_fallback_handler
+        handle_unexpected_error = self.mock_dependency(handler, '_handle_unexpected_error')
 
         blob_id = 'blob_id'
         event = {'ExecutionName': blob_id}
         handler.handle(event, {})
 
-        self.handle_unexpected_error.assert_called_with(blob_id)
+        handle_unexpected_error.assert_called_with(blob_id)
 
     def test_handling_when_execution_name_is_not_specified(self):
-        handler = self.set_up_handler()
+        handler = self.container.unexpected_error_fallback_handler
+        handle_unexpected_error = self.mock_dependency(handler, '_handle_unexpected_error')
 
         handler.handle({}, {})
 
-        self.handle_unexpected_error.assert_not_called()
+        handle_unexpected_error.assert_not_called()
+
+
+class TestUuidGenerator(unittest.TestCase):  # pragma: no cover
+
+    def test_generating_unique_uuids(self):
+        ids = [uuid_generator() for _ in range(UUID_POOL_SIZE * 2 + 1)]
+
+        self.assertEqual(len(set(ids)), len(ids))
+        for blob_id in ids:
+            self.assertEqual(UUID(blob_id).version, 4)
+            self.assertEqual(str(UUID(blob_id)), blob_id)